@@ -1,40 +1,200 @@
-﻿from flask import Flask, jsonify, request
+﻿from flask import Flask, Response, after_this_request, g, jsonify, make_response, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import json
+from werkzeug.local import LocalProxy
 import os
-from datetime import datetime
-from services.note_service import NoteService
-from services.label_service import LabelService
+from functools import wraps
+from models.note import Note
+from services.json_encoder import orjson
+from services import api, http_compression
+from services.factory import DEFAULT_CONFIG, WORKSPACE_PATH_RE, Services
 from pathlib import Path
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON для jsonify и request.get_json: orjson, если установлен, иначе стандартный json"""
+
+    def dumps(self, obj, **kwargs):
+        # С отступами (отладочный режим) orjson не умеет - отдаем стандартному json
+        if orjson is None or kwargs.get('indent'):
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
-CORS(app)
+app.json = FastJSONProvider(app)
+# X-Revision читает фронтенд для /api/notes/changes
+CORS(app, expose_headers=['X-Revision'])
+# Настройки по умолчанию - в services/factory.py; переопределяются переменными NOTES_<имя>
+app.config.update(DEFAULT_CONFIG)
+app.config.from_prefixed_env('NOTES')
 
 
 
 
 BACKEND_DIR = Path(__file__).parent.absolute()
 DATA_DIR = BACKEND_DIR / "data"
-NOTES_FILE = DATA_DIR / "notes.json"
-LABELS_FILE = DATA_DIR / "labels.json"
-DATA_DIR.mkdir(exist_ok=True)
-note_service = NoteService(NOTES_FILE)
-label_service = LabelService(LABELS_FILE)
+
+services = Services(app.config, DATA_DIR)
+# Сервисы пространства текущего запроса (заголовок X-Workspace-Id или префикс /api/w/<id>)
+event_bus = LocalProxy(lambda: g.workspace.event_bus)
+note_service = LocalProxy(lambda: g.workspace.notes)
+label_service = LocalProxy(lambda: g.workspace.labels)
+
+
+class WorkspacePrefix:
+    """WSGI-обертка: /api/w/<id>/notes обрабатывается как /api/notes с заголовком X-Workspace-Id: <id>"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        match = WORKSPACE_PATH_RE.match(environ.get('PATH_INFO', ''))
+        if match:
+            environ['HTTP_X_WORKSPACE_ID'] = match.group(1)
+            environ['PATH_INFO'] = '/api' + match.group(2)
+        return self.wsgi_app(environ, start_response)
+
+
+app.wsgi_app = WorkspacePrefix(app.wsgi_app)
+
+
+@app.before_request
+def open_workspace():
+    try:
+        g.workspace = services.acquire(request.headers.get('X-Workspace-Id'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.after_request
+def compress_response(response):
+    """Сжать JSON-ответ (br или gzip), если клиент это принимает"""
+    if not http_compression.is_compressible(response.mimetype):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = http_compression.choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None or response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+        return response
+    if response.is_streamed:
+        response.response = http_compression.compress_chunks(encoding, response.iter_encoded())
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < http_compression.MIN_SIZE:
+            return response
+        response.set_data(http_compression.compress(encoding, data))
+    response.headers['Content-Encoding'] = encoding
+    if 'ETag' in response.headers:
+        response.headers['ETag'] = http_compression.weak_etag(response.headers['ETag'])
+    return response
+
+
+@app.teardown_request
+def release_workspace(exc):
+    # Пока запрос не завершен, пространство не выгружается
+    workspace = g.pop('workspace', None)
+    if workspace is not None:
+        services.release(workspace)
+
+
+def conditional(*names):
+    """ETag и Last-Modified для списка; 304 без построения ответа, если у клиента актуальная копия.
+
+    names - сервисы пространства ('notes', 'labels'), чьи данные входят в список.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, modified_at = api.list_validators(g.workspace, names, request.query_string)
+            if api.is_fresh(etag, modified_at, request.headers.get('If-None-Match'),
+                            request.headers.get('If-Modified-Since')):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.headers.update(api.list_headers(etag, modified_at))
+            return response
+        return wrapper
+    return decorator
+
 
 @app.route('/api/notes', methods=['GET'])
+@conditional('notes')
 def get_notes():
+    # Ревизия берется до чтения заметок: список не старше нее
+    revision = note_service.get_revision()
+
+    @after_this_request
+    def add_revision(response):
+        response.headers['X-Revision'] = revision
+        return response
+
     status_filter = request.args.get('status')
     label_filter = request.args.get('label')
-    notes = note_service.get_notes(status_filter=status_filter, label_filter=label_filter)
+    fields = api.parse_fields(request.args.get('fields'))
+    try:
+        # С limit или cursor отдаем страницу {notes, next_cursor}, иначе - весь список
+        if 'limit' in request.args or 'cursor' in request.args:
+            page = note_service.get_notes_page(
+                status_filter=status_filter,
+                label_filter=label_filter,
+                limit=api.parse_limit(request.args.get('limit'), 50),
+                cursor=request.args.get('cursor'),
+                fields=fields
+            )
+            return jsonify(page)
+        if not fields:
+            # Полный список собираем из готовых JSON-фрагментов заметок и отдаем по частям
+            chunks = note_service.iter_notes_json(status_filter=status_filter, label_filter=label_filter)
+            return Response(chunks, mimetype='application/json')
+        notes = note_service.get_notes(status_filter=status_filter, label_filter=label_filter, fields=fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(notes)
+
+
+@app.route('/api/notes/changes', methods=['GET'])
+def get_changes():
+    """Изменения заметок после ревизии since (ревизию отдают этот же запрос и GET /api/notes)"""
+    since = request.args.get('since')
+    if not since:
+        return jsonify({'error': 'since is required'}), 400
+    try:
+        changes = note_service.get_changes(since)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if changes is None:
+        # Клиент слишком отстал: пусть заново загрузит весь список
+        return jsonify({'error': 'Resync required', 'revision': note_service.get_revision()}), 410
+    return jsonify(changes)
+
+
+@app.route('/api/notes/search', methods=['GET'])
+def search_notes():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query is required'}), 400
+    fields = api.parse_fields(request.args.get('fields'))
+    try:
+        notes = note_service.search_notes(query, limit=api.parse_limit(request.args.get('limit'), 20), fields=fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(notes)
 
 
 @app.route('/api/notes/<int:note_id>', methods=['GET'])
 def get_note(note_id):
-    # Получаем все заметки
-    all_notes = note_service.get_notes()
-    # Ищем нужную заметку по ID
-    note = next((n for n in all_notes if n['id'] == note_id), None)
-    
+    note = note_service.get_note(note_id)
     if note:
         return jsonify(note)
     return jsonify({'error': 'Note not found'}), 404
@@ -44,8 +204,10 @@ def get_note(note_id):
 @app.route('/api/notes', methods=['POST'])
 def create_note():
     data = request.get_json()
-    if not data or 'title' not in data:
-        return jsonify({'error': 'Title is required'}), 400
+    try:
+        Note.check_fields(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     note = note_service.create_note(
         title=data.get('title'),
         content=data.get('content', ''),
@@ -53,9 +215,23 @@ def create_note():
     )
     return jsonify(note), 201
 
+
+@app.route('/api/notes:batch', methods=['POST'])
+def notes_batch():
+    """Создать, изменить и удалить несколько заметок одним запросом"""
+    try:
+        operations = api.parse_operations(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'results': note_service.apply_batch(operations)})
+
 @app.route('/api/notes/<int:note_id>', methods=['PUT'])
 def update_note(note_id):
     data = request.get_json()
+    try:
+        Note.check_fields(data, partial=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     note = note_service.update_note(
         note_id=note_id,
         title=data.get('title'),
@@ -72,10 +248,42 @@ def delete_note(note_id):
     note_service.delete_note(note_id)
     return '', 204
 
+
+@app.route('/api/export', methods=['GET'])
+def export_notes():
+    """Выгрузить все заметки в формате NDJSON - по заметке на строку"""
+    # Выгрузка идет уже после конца запроса, когда g недоступен: пространство
+    # берется еще раз и возвращается, когда сервер закроет ответ
+    workspace = services.acquire(request.headers.get('X-Workspace-Id'))
+    response = Response(
+        api.export_ndjson(workspace.notes),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=notes.ndjson'}
+    )
+    response.call_on_close(lambda: services.release(workspace))
+    return response
+
+
+@app.route('/api/import', methods=['POST'])
+def import_notes():
+    """Загрузить заметки из NDJSON; тело читается построчно, заметки сохраняются пачками"""
+    importer = api.NoteImport(note_service, keep_ids=api.parse_flag(request.args.get('keep_ids')))
+    for line in request.stream:
+        chunk = importer.add_line(line)
+        if chunk:
+            importer.save(chunk)
+    chunk = importer.finish()
+    if chunk:
+        importer.save(chunk)
+    return jsonify(importer.result())
+
+
 @app.route('/api/labels', methods=['GET'])
+@conditional('labels', 'notes')
 def get_labels():
-    labels = label_service.get_labels()
-    return jsonify(labels)
+    if api.parse_flag(request.args.get('with_counts')):
+        return jsonify(g.workspace.get_labels_with_counts())
+    return Response(label_service.get_labels_json(), mimetype='application/json')
 
 
 @app.route('/api/labels', methods=['POST'])
@@ -85,8 +293,14 @@ def create_label():
     
     if not data or 'name' not in data:
         return jsonify({'error': 'Label name is required'}), 400
+    if not isinstance(data['name'], str):
+        return jsonify({'error': 'Label name must be a string'}), 400
     
     try:
+        # Метка с таким именем уже есть - отдаем ее без записи на диск
+        label = label_service.find_by_name(data.get('name'))
+        if label:
+            return jsonify(label), 200
         label = label_service.create_label(
             name=data.get('name'))
         return jsonify(label), 201
@@ -95,28 +309,58 @@ def create_label():
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+@app.route('/api/labels:batch', methods=['POST'])
+def labels_batch():
+    """Создать и удалить несколько меток одним запросом"""
+    try:
+        operations = api.parse_operations(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'results': g.workspace.apply_labels_batch(operations)})
+
 @app.route('/api/labels/<int:label_id>', methods=['DELETE'])
 def delete_label(label_id):
     """Удалить метку"""
     try:
-        # Находим метку по ID
-        labels = label_service.get_labels()
-        label_to_delete = next((label for label in labels if label['id'] == label_id), None)
-        
-        if not label_to_delete:
+        # Метка удаляется и из всех заметок
+        if not g.workspace.delete_label(label_id):
             return jsonify({'error': 'Label not found'}), 404
-        
-        # Удаляем метку из всех заметок
-        note_service.remove_label_from_all_notes(label_to_delete['name'])
-        
-        # Удаляем саму метку
-        label_service.delete_label(label_id)
-        
         return '', 204
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/events', methods=['GET'])
+def events():
+    """Поток Server-Sent Events об изменениях заметок и меток"""
+    # Подписываемся сразу: поток отдается уже после конца запроса, когда g недоступен,
+    # а подписчик не дает выгрузить пространство
+    subscription = event_bus.subscribe()
+
+    def generate():
+        yield api.EVENTS_RETRY
+        while not subscription.closed():
+            yield api.format_event(subscription.get(timeout=api.EVENTS_HEARTBEAT))
+
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Отписка при закрытии ответа - даже если поток так и не начал отдаваться
+    response.call_on_close(subscription.close)
+    return response
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Счетчики кэша ответов пространства (попадания, промахи, размер) для мониторинга"""
+    stats = note_service.get_cache_stats()
+    if stats is None:
+        return jsonify({'error': 'Response cache is disabled'}), 404
+    return jsonify(stats)
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'ok'})
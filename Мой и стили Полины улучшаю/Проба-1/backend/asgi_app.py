@@ -0,0 +1,420 @@
+"""ASGI-версия API (Starlette) с теми же маршрутами, что и app.py.
+
+Все, что берет блокировки сервисов, выполняется в пуле потоков: изменения
+ждут запись на диск, а чтения - блокировку, которую держит изменение.
+В цикле событий остаются разбор запроса, кодирование ответа и подписчики
+/api/events, так что один процесс держит тысячи соединений.
+Изменения других процессов тоже перечитываются в пуле потоков: перед
+каждым запросом это делает WorkspaceMiddleware, а сами чтения диск
+не проверяют (sync_on_read=False).
+Пространство (workspace) выбирается так же, как в app.py: заголовком
+X-Workspace-Id или префиксом /api/w/<id>/.
+
+Запуск из папки backend:
+    uvicorn asgi_app:app --port 5000
+"""
+import asyncio
+from functools import wraps
+from pathlib import Path
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from models.note import Note
+from services import api, http_compression, json_encoder
+from services.factory import WORKSPACE_PATH_RE, Services, load_config
+
+
+BACKEND_DIR = Path(__file__).parent.absolute()
+DATA_DIR = BACKEND_DIR / "data"
+
+services = Services(load_config(), DATA_DIR, sync_on_read=False)
+
+
+def json_response(data, status_code=200):
+    return Response(json_encoder.dumps(data), status_code=status_code, media_type='application/json')
+
+
+def error_response(message, status_code=400):
+    return json_response({'error': message}, status_code)
+
+
+async def get_json(request):
+    """Тело запроса как JSON; None, если тело пустое или не JSON"""
+    body = await request.body()
+    try:
+        return json_encoder.loads(body)
+    except ValueError:
+        return None
+
+
+def acquire_synced(workspace_id):
+    """Пространство для запроса с перечитанными изменениями других процессов"""
+    workspace = services.acquire(workspace_id)
+    try:
+        workspace.sync()
+    except BaseException:
+        services.release(workspace)
+        raise
+    return workspace
+
+
+class WorkspaceMiddleware:
+    """Пространство запроса (X-Workspace-Id или префикс /api/w/<id>) в request.state.workspace.
+
+    Пространство занято, пока не отдан весь ответ, включая поток /api/events.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        workspace_id = None
+        match = WORKSPACE_PATH_RE.match(scope['path'])
+        if match:
+            workspace_id = match.group(1)
+            scope = dict(scope, path='/api' + match.group(2))
+        else:
+            for name, value in scope['headers']:
+                if name == b'x-workspace-id':
+                    workspace_id = value.decode('latin-1')
+        try:
+            # Загрузка пространства и перечитывание чужих изменений читают диск - в пуле потоков
+            workspace = await run_in_threadpool(acquire_synced, workspace_id)
+        except ValueError as e:
+            await error_response(str(e))(scope, receive, send)
+            return
+        scope.setdefault('state', {})['workspace'] = workspace
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            services.release(workspace)
+
+
+class CompressionMiddleware:
+    """Сжатие JSON-ответов (br или gzip) по Accept-Encoding - то же, что compress_response в app.py"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = http_compression.choose_encoding(Headers(scope=scope).get('accept-encoding'))
+        start = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message['type'] == 'http.response.start':
+                # Заголовки отправим вместе с первым куском тела, когда станет ясно, сжимать ли
+                start = message
+                return
+            if start is not None:
+                headers = MutableHeaders(scope=start)
+                body = message.get('body', b'')
+                more_body = message.get('more_body', False)
+                if http_compression.is_compressible(headers.get('content-type')):
+                    headers.add_vary_header('Accept-Encoding')
+                    if (encoding is not None and start['status'] not in (204, 304)
+                            and 'content-encoding' not in headers
+                            and (more_body or len(body) >= http_compression.MIN_SIZE)):
+                        compressor = http_compression.Compressor(encoding)
+                        headers['Content-Encoding'] = encoding
+                        if 'content-length' in headers:
+                            del headers['content-length']
+                        if 'etag' in headers:
+                            headers['ETag'] = http_compression.weak_etag(headers['etag'])
+                await send(start)
+                start = None
+            if compressor is not None and message['type'] == 'http.response.body':
+                more_body = message.get('more_body', False)
+                data = compressor.compress(message.get('body', b''))
+                if not more_body:
+                    data += compressor.flush()
+                message = {'type': 'http.response.body', 'body': data, 'more_body': more_body}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+def conditional(*names):
+    """ETag/Last-Modified и ответ 304 - то же, что conditional в app.py.
+
+    names - сервисы пространства ('notes', 'labels'), чьи данные входят в список.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request):
+            etag, modified_at = api.list_validators(
+                request.state.workspace, names, request.scope['query_string'])
+            if api.is_fresh(etag, modified_at, request.headers.get('if-none-match'),
+                            request.headers.get('if-modified-since')):
+                response = Response(status_code=304)
+            else:
+                response = await view(request)
+                if response.status_code != 200:
+                    return response
+            response.headers.update(api.list_headers(etag, modified_at))
+            return response
+        return wrapper
+    return decorator
+
+
+@conditional('notes')
+async def get_notes(request):
+    note_service = request.state.workspace.notes
+    revision = note_service.get_revision()
+    status_filter = request.query_params.get('status')
+    label_filter = request.query_params.get('label')
+    fields = api.parse_fields(request.query_params.get('fields'))
+    try:
+        if 'limit' in request.query_params or 'cursor' in request.query_params:
+            response = json_response(await run_in_threadpool(
+                note_service.get_notes_page,
+                status_filter=status_filter,
+                label_filter=label_filter,
+                limit=api.parse_limit(request.query_params.get('limit'), 50),
+                cursor=request.query_params.get('cursor'),
+                fields=fields
+            ))
+        elif not fields:
+            chunks = await run_in_threadpool(
+                note_service.iter_notes_json, status_filter=status_filter, label_filter=label_filter)
+            response = StreamingResponse(chunks, media_type='application/json')
+        else:
+            response = json_response(await run_in_threadpool(
+                note_service.get_notes, status_filter=status_filter, label_filter=label_filter, fields=fields))
+    except ValueError as e:
+        return error_response(str(e))
+    response.headers['X-Revision'] = revision
+    return response
+
+
+async def get_changes(request):
+    note_service = request.state.workspace.notes
+    since = request.query_params.get('since')
+    if not since:
+        return error_response('since is required')
+    try:
+        changes = await run_in_threadpool(note_service.get_changes, since)
+    except ValueError as e:
+        return error_response(str(e))
+    if changes is None:
+        return json_response({'error': 'Resync required', 'revision': note_service.get_revision()}, 410)
+    return json_response(changes)
+
+
+async def search_notes(request):
+    note_service = request.state.workspace.notes
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return error_response('Query is required')
+    try:
+        notes = await run_in_threadpool(
+            note_service.search_notes, query,
+            limit=api.parse_limit(request.query_params.get('limit'), 20),
+            fields=api.parse_fields(request.query_params.get('fields')))
+    except ValueError as e:
+        return error_response(str(e))
+    return json_response(notes)
+
+
+async def get_note(request):
+    note_service = request.state.workspace.notes
+    note = await run_in_threadpool(note_service.get_note, request.path_params['note_id'])
+    if note:
+        return json_response(note)
+    return error_response('Note not found', 404)
+
+
+async def create_note(request):
+    note_service = request.state.workspace.notes
+    data = await get_json(request)
+    try:
+        Note.check_fields(data)
+    except ValueError as e:
+        return error_response(str(e))
+    note = await run_in_threadpool(
+        note_service.create_note,
+        title=data.get('title'),
+        content=data.get('content', ''),
+        labels=data.get('labels', [])
+    )
+    return json_response(note, 201)
+
+
+async def update_note(request):
+    note_service = request.state.workspace.notes
+    data = await get_json(request)
+    try:
+        Note.check_fields(data, partial=True)
+    except ValueError as e:
+        return error_response(str(e))
+    note = await run_in_threadpool(
+        note_service.update_note,
+        note_id=request.path_params['note_id'],
+        title=data.get('title'),
+        content=data.get('content'),
+        status=data.get('status'),
+        labels=data.get('labels')
+    )
+    if note:
+        return json_response(note)
+    return error_response('Note not found', 404)
+
+
+async def delete_note(request):
+    note_service = request.state.workspace.notes
+    await run_in_threadpool(note_service.delete_note, request.path_params['note_id'])
+    return Response(status_code=204)
+
+
+async def notes_batch(request):
+    note_service = request.state.workspace.notes
+    try:
+        operations = api.parse_operations(await get_json(request))
+    except ValueError as e:
+        return error_response(str(e))
+    results = await run_in_threadpool(note_service.apply_batch, operations)
+    return json_response({'results': results})
+
+
+async def export_notes(request):
+    # Синхронный генератор StreamingResponse обходит в пуле потоков
+    return StreamingResponse(
+        api.export_ndjson(request.state.workspace.notes),
+        media_type='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=notes.ndjson'}
+    )
+
+
+async def import_notes(request):
+    importer = api.NoteImport(request.state.workspace.notes,
+                              keep_ids=api.parse_flag(request.query_params.get('keep_ids')))
+    buffer = b''
+
+    async def read_lines():
+        nonlocal buffer
+        async for data in request.stream():
+            buffer += data
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                yield line
+        if buffer:
+            yield buffer
+
+    async for line in read_lines():
+        chunk = importer.add_line(line)
+        if chunk:
+            await run_in_threadpool(importer.save, chunk)
+    chunk = importer.finish()
+    if chunk:
+        await run_in_threadpool(importer.save, chunk)
+    return json_response(importer.result())
+
+
+@conditional('labels', 'notes')
+async def get_labels(request):
+    workspace = request.state.workspace
+    if api.parse_flag(request.query_params.get('with_counts')):
+        return json_response(await run_in_threadpool(workspace.get_labels_with_counts))
+    return Response(await run_in_threadpool(workspace.labels.get_labels_json), media_type='application/json')
+
+
+async def create_label(request):
+    label_service = request.state.workspace.labels
+    data = await get_json(request)
+    if not isinstance(data, dict) or 'name' not in data:
+        return error_response('Label name is required')
+    if not isinstance(data['name'], str):
+        return error_response('Label name must be a string')
+    # Метка с таким именем уже есть - отдаем ее без записи на диск
+    label = await run_in_threadpool(label_service.find_by_name, data['name'])
+    if label:
+        return json_response(label)
+    try:
+        label = await run_in_threadpool(label_service.create_label, name=data.get('name'))
+    except ValueError as e:
+        return error_response(str(e))
+    return json_response(label, 201)
+
+
+async def labels_batch(request):
+    try:
+        operations = api.parse_operations(await get_json(request))
+    except ValueError as e:
+        return error_response(str(e))
+    results = await run_in_threadpool(request.state.workspace.apply_labels_batch, operations)
+    return json_response({'results': results})
+
+
+async def delete_label(request):
+    workspace = request.state.workspace
+    if not await run_in_threadpool(workspace.delete_label, request.path_params['label_id']):
+        return error_response('Label not found', 404)
+    return Response(status_code=204)
+
+
+async def events(request):
+    """Поток Server-Sent Events; подписчик ждет событий без отдельного потока"""
+    event_bus = request.state.workspace.event_bus
+
+    async def generate():
+        with event_bus.subscribe(loop=asyncio.get_running_loop()) as subscription:
+            yield api.EVENTS_RETRY
+            while not subscription.closed():
+                yield api.format_event(await subscription.get_async(timeout=api.EVENTS_HEARTBEAT))
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def cache_stats(request):
+    stats = request.state.workspace.notes.get_cache_stats()
+    if stats is None:
+        return error_response('Response cache is disabled', 404)
+    return json_response(stats)
+
+
+async def health_check(request):
+    return json_response({'status': 'ok'})
+
+
+routes = [
+    Route('/api/notes', get_notes, methods=['GET']),
+    Route('/api/notes', create_note, methods=['POST']),
+    Route('/api/notes/changes', get_changes, methods=['GET']),
+    Route('/api/notes/search', search_notes, methods=['GET']),
+    Route('/api/notes:batch', notes_batch, methods=['POST']),
+    Route('/api/notes/{note_id:int}', get_note, methods=['GET']),
+    Route('/api/notes/{note_id:int}', update_note, methods=['PUT']),
+    Route('/api/notes/{note_id:int}', delete_note, methods=['DELETE']),
+    Route('/api/export', export_notes, methods=['GET']),
+    Route('/api/import', import_notes, methods=['POST']),
+    Route('/api/labels', get_labels, methods=['GET']),
+    Route('/api/labels', create_label, methods=['POST']),
+    Route('/api/labels:batch', labels_batch, methods=['POST']),
+    Route('/api/labels/{label_id:int}', delete_label, methods=['DELETE']),
+    Route('/api/events', events, methods=['GET']),
+    Route('/api/cache/stats', cache_stats, methods=['GET']),
+    Route('/api/health', health_check, methods=['GET']),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'],
+                           allow_headers=['*'], expose_headers=['X-Revision']),
+                Middleware(CompressionMiddleware),
+                Middleware(WorkspaceMiddleware)]
+)
@@ -0,0 +1,64 @@
+"""Сравнение способов кодирования списка заметок в JSON.
+
+Запуск из папки backend:
+    python benchmarks/json_encoding.py [число заметок]
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.note import Note
+from services import json_encoder
+
+
+def make_notes(count):
+    return [
+        Note(
+            id=i,
+            title=f"Заметка {i}",
+            content="Текст заметки про работу и личные дела. " * 5,
+            labels=["работа", "срочно"] if i % 3 else ["личное"],
+            created_at="2025-12-14T16:17:18.599473",
+            updated_at="2025-12-15T17:18:51.123456"
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def measure(name, func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<40} {best * 1000:8.1f} мс  {size / 1024 / 1024:6.1f} МБ")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    notes = make_notes(count)
+    print(f"Заметок: {count}, orjson: {'есть' if json_encoder.orjson else 'не установлен'}")
+
+    measure("json.dumps (как jsonify)",
+            lambda: len(json.dumps([note.to_dict() for note in notes], ensure_ascii=False)))
+    if json_encoder.orjson is not None:
+        measure("orjson.dumps",
+                lambda: len(json_encoder.orjson.dumps([note.to_dict() for note in notes])))
+
+    for note in notes:
+        note._json = None
+    measure("фрагменты, первый запрос", lambda: len(''.join(
+        json_encoder.iter_json_list(notes, encode=Note.to_json))), repeat=1)
+    measure("фрагменты из кэша", lambda: len(''.join(
+        json_encoder.iter_json_list(notes, encode=Note.to_json))))
+    # Поток: максимальный кусок в памяти вместо всего ответа
+    measure("поток, самый большой кусок", lambda: max(
+        len(chunk) for chunk in json_encoder.iter_json_list(notes, encode=Note.to_json)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,15 @@
+from services import json_encoder
+
+
 class Label:
+    # __slots__ вместо __dict__: меток может быть десятки тысяч
+    __slots__ = ('id', 'name', 'color', '_json')
+
     def __init__(self, id: int, name: str, color: str = "#3498db"):
         self.id = id
         self.name = name
         self.color = color
+        self._json = None
     
     def to_dict(self):
         
@@ -11,6 +18,12 @@ class Label:
             'name': self.name,
             'color': self.color
         }
+
+    def to_json(self):
+        """JSON метки; считается один раз, метки не изменяются"""
+        if self._json is None:
+            self._json = json_encoder.dumps(self.to_dict())
+        return self._json
     
     @classmethod
     def from_dict(cls, data):
@@ -1,23 +1,24 @@
 from datetime import datetime
-from typing import List
-from flask import Flask, jsonify, request
-from flask_cors import CORS
-import json
-import os
+from services import json_encoder
+from storage.compression import CompressedText, compress_text
 
 class NoteStatus:
     ACTIVE = "active"
     COMPLETED = "completed"
     ARCHIVED = "archived"
+    ALL = (ACTIVE, COMPLETED, ARCHIVED)
 
 class Note:
+    # __slots__ вместо __dict__ экономит память на каждой заметке
+    __slots__ = ('id', 'title', '_content', 'status', 'labels', 'created_at', 'updated_at', '_json')
+
     def __init__(self, id, title, content, status=NoteStatus.ACTIVE, labels=None, created_at=None, updated_at=None):
         self.id = id
         self.title = title
         self.content = content
         self.status = status
         self.labels = labels or []
-        #  created_at - ,   ,    
+        # Если created_at - строка, оставляем как есть, иначе создаем новую дату
         if isinstance(created_at, str):
             self.created_at = created_at
         else:
@@ -28,6 +29,33 @@ class Note:
         else:
             self.updated_at = updated_at or datetime.now().isoformat()
     
+    @property
+    def content(self):
+        content = self._content
+        # Длинный текст хранится сжатым и распаковывается при каждом обращении
+        return content.text() if isinstance(content, CompressedText) else content
+
+    @content.setter
+    def content(self, value):
+        object.__setattr__(self, '_content', compress_text(value))
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        # Любое изменение поля сбрасывает сохраненный JSON.
+        # Поэтому labels не меняем на месте, а присваиваем новый список
+        if name != '_json':
+            object.__setattr__(self, '_json', None)
+
+    def to_json(self):
+        """JSON заметки; строится при первом обращении и хранится до изменения заметки"""
+        if self._json is not None:
+            return self._json
+        data = json_encoder.dumps(self.to_dict())
+        # JSON заметки со сжатым текстом не храним - иначе текст лежал бы в памяти и несжатым
+        if not isinstance(self._content, CompressedText):
+            self._json = data
+        return data
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -35,6 +63,66 @@ class Note:
             'content': self.content,
             'status': self.status,
             'labels': self.labels,
-            'created_at': self.created_at,  #  .isoformat()
-            'updated_at': self.updated_at   #  .isoformat()
-        }
\ No newline at end of file
+            'created_at': self.created_at,  # Убираем .isoformat()
+            'updated_at': self.updated_at   # Убираем .isoformat()
+        }
+
+    def to_record(self):
+        """Как to_dict, но сжатый content остается CompressedText - для записи в хранилище"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'content': self._content,
+            'status': self.status,
+            'labels': self.labels,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+    @staticmethod
+    def check_fields(data, partial=False):
+        """Проверить title, content, status и labels (ValueError, если не подходят).
+
+        partial=True - для изменения заметки: проверяются только переданные поля.
+        """
+        if not isinstance(data, dict):
+            raise ValueError('Note must be an object')
+        if not partial or 'title' in data:
+            title = data.get('title')
+            if not isinstance(title, str) or not title.strip():
+                raise ValueError('Title is required')
+        if 'content' in data and not isinstance(data['content'], str):
+            raise ValueError('content must be a string')
+        if 'status' in data and data['status'] not in NoteStatus.ALL:
+            raise ValueError(f"Unknown status: {data['status']}")
+        if 'labels' in data:
+            labels = data['labels']
+            if not isinstance(labels, list) or not all(isinstance(label, str) for label in labels):
+                raise ValueError('labels must be a list of strings')
+
+    @classmethod
+    def from_dict(cls, data):
+        """Создать заметку из словаря с проверкой полей (ValueError, если данные не подходят)"""
+        if not isinstance(data, dict):
+            raise ValueError('Note must be an object')
+
+        note_id = data.get('id')
+        if note_id is not None and (type(note_id) is not int or note_id < 1):
+            raise ValueError('id must be a positive integer')
+        cls.check_fields(data)
+        for key in ('created_at', 'updated_at'):
+            if data.get(key) is not None:
+                try:
+                    datetime.fromisoformat(data[key])
+                except (TypeError, ValueError):
+                    raise ValueError(f'{key} must be an ISO 8601 date')
+
+        return cls(
+            id=note_id,
+            title=data['title'],
+            content=data.get('content', ''),
+            status=data.get('status', NoteStatus.ACTIVE),
+            labels=data.get('labels', []),
+            created_at=data.get('created_at'),
+            updated_at=data.get('updated_at')
+        )
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""Логика маршрутов API, общая для app.py (Flask) и asgi_app.py (Starlette).
+
+Здесь то, что не зависит от фреймворка: разбор параметров и пакетных
+запросов, ETag списков, импорт и выгрузка NDJSON, формат событий SSE.
+Приложения только читают запрос и собирают ответ своими средствами.
+"""
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from datetime import timezone
+from models.note import Note
+from services import json_encoder
+
+
+MAX_BATCH_SIZE = 1000
+IMPORT_CHUNK_SIZE = 500
+MAX_IMPORT_ERRORS = 100
+# Раз в столько секунд молчащему подписчику /api/events уходит пинг
+EVENTS_HEARTBEAT = 15
+# Через 3 секунды после обрыва браузер переподключится сам
+EVENTS_RETRY = 'retry: 3000\n\n'
+# Комментарий-пинг: не дает прокси закрыть молчащее соединение
+EVENTS_PING = ': ping\n\n'
+
+
+def parse_fields(value):
+    """Список полей из параметра fields=id,title,..."""
+    if not value:
+        return None
+    return [field.strip() for field in value.split(',') if field.strip()]
+
+
+def parse_limit(value, default):
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+
+
+def parse_flag(value):
+    return value in ('1', 'true')
+
+
+def parse_operations(data):
+    """Список операций из тела пакетного запроса: массив или {"operations": [...]}"""
+    if isinstance(data, dict):
+        data = data.get('operations')
+    if not isinstance(data, list):
+        raise ValueError('Operations list is required')
+    if len(data) > MAX_BATCH_SIZE:
+        raise ValueError(f'Too many operations, max {MAX_BATCH_SIZE}')
+    return data
+
+
+def list_validators(workspace, names, query_string):
+    """(ETag, время изменения) списка.
+
+    names - сервисы пространства ('notes', 'labels'), чьи поколения входят в ETag;
+    query_string (bytes) - параметры запроса, то есть фильтры. ETag всегда слабый:
+    сжатый ответ 200 получает слабый ETag, и у 304 он должен быть тем же.
+    """
+    versions = [getattr(workspace, name).get_generation() for name in names]
+    generation = '.'.join(str(generation) for generation, _ in versions)
+    modified_at = int(max(modified_at for _, modified_at in versions))
+    return f'W/"{workspace.tag}-{generation}-{zlib.crc32(query_string):08x}"', modified_at
+
+
+def is_fresh(etag, modified_at, if_none_match, if_modified_since):
+    """Копия клиента актуальна - можно ответить 304.
+
+    If-None-Match важнее If-Modified-Since (RFC 9110); ETag сравниваются слабо.
+    """
+    if if_none_match:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag.removeprefix('W/') in tags
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return modified_at <= since.timestamp()
+    return False
+
+
+def list_headers(etag, modified_at):
+    return {
+        'ETag': etag,
+        'Last-Modified': formatdate(modified_at, usegmt=True),
+        # Браузер хранит ответ, но каждый раз сверяет его с сервером
+        'Cache-Control': 'no-cache'
+    }
+
+
+def export_ndjson(note_service):
+    """Выгрузка заметок в NDJSON кусками по IMPORT_CHUNK_SIZE строк"""
+    lines = []
+    for note in note_service.export_notes():
+        lines.append(json_encoder.dumps(note) + '\n')
+        if len(lines) >= IMPORT_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+class NoteImport:
+    """Импорт NDJSON: строки разбираются по одной, заметки сохраняются пачками.
+
+    add_line возвращает пачку, когда она набралась; ее сохраняет save
+    (asgi_app вызывает save в пуле потоков). Остаток отдает finish.
+    """
+
+    def __init__(self, note_service, keep_ids=False):
+        self.note_service = note_service
+        self.keep_ids = keep_ids
+        self.chunk = []
+        self.line_no = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_line(self, line):
+        self.line_no += 1
+        if not line.strip():
+            return None
+        try:
+            self.chunk.append(Note.from_dict(json_encoder.loads(line)))
+        except ValueError as e:
+            self.failed += 1
+            if len(self.errors) < MAX_IMPORT_ERRORS:
+                self.errors.append({'line': self.line_no, 'error': str(e)})
+            return None
+        if len(self.chunk) < IMPORT_CHUNK_SIZE:
+            return None
+        chunk, self.chunk = self.chunk, []
+        return chunk
+
+    def finish(self):
+        chunk, self.chunk = self.chunk, []
+        return chunk or None
+
+    def save(self, chunk):
+        self.imported += self.note_service.import_notes(chunk, keep_ids=self.keep_ids)
+
+    def result(self):
+        return {'imported': self.imported, 'failed': self.failed, 'errors': self.errors}
+
+
+def format_event(event):
+    """Событие (имя, данные) в формате Server-Sent Events; None - пинг"""
+    if event is None:
+        return EVENTS_PING
+    name, data = event
+    return f'event: {name}\ndata: {json_encoder.dumps(data)}\n\n'
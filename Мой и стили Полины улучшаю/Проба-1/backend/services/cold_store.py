@@ -0,0 +1,95 @@
+import tempfile
+import threading
+
+
+# Файл переписывается, когда мусор от удаленных и перезаписанных заметок
+# больше половины файла и больше этого числа байт
+COMPACT_MIN_GARBAGE = 1024 * 1024
+
+
+class ColdStore:
+    """Холодное хранилище: заметки (в JSON) лежат во временном файле, в памяти - только смещения.
+
+    Это не источник истины, а вынесенная из памяти часть данных сервиса:
+    файл анонимный, у каждого процесса свой, и при перечитывании заметок
+    он заполняется заново.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.file = self._open()
+        self.entries = {}  # id -> (смещение, длина, updated_at)
+        self.size = 0
+        self.garbage = 0
+        # Файловая позиция общая, а читают из нескольких потоков сразу
+        self.lock = threading.Lock()
+
+    def _open(self):
+        return tempfile.TemporaryFile(dir=self.directory, prefix='notes-archive-')
+
+    def __contains__(self, note_id):
+        return note_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def ids(self):
+        return list(self.entries)
+
+    def updated_at(self, note_id):
+        return self.entries[note_id][2]
+
+    def read(self, note_id):
+        """JSON заметки строкой"""
+        with self.lock:
+            offset, length, _ = self.entries[note_id]
+            self.file.seek(offset)
+            return self.file.read(length).decode('utf-8')
+
+    def put(self, note):
+        data = note.to_json().encode('utf-8')
+        with self.lock:
+            old = self.entries.get(note.id)
+            if old is not None:
+                self.garbage += old[1]
+            self.file.seek(self.size)
+            self.file.write(data)
+            self.entries[note.id] = (self.size, len(data), note.updated_at)
+            self.size += len(data)
+        self._maybe_compact()
+
+    def remove(self, note_id):
+        entry = self.entries.pop(note_id, None)
+        if entry is not None:
+            self.garbage += entry[1]
+            self._maybe_compact()
+
+    def clear(self):
+        with self.lock:
+            self.file.close()
+            self.file = self._open()
+            self.entries = {}
+            self.size = 0
+            self.garbage = 0
+
+    def _maybe_compact(self):
+        if self.garbage < COMPACT_MIN_GARBAGE or self.garbage * 2 < self.size:
+            return
+        with self.lock:
+            new_file = self._open()
+            entries = {}
+            size = 0
+            for note_id, (offset, length, updated_at) in self.entries.items():
+                self.file.seek(offset)
+                new_file.write(self.file.read(length))
+                entries[note_id] = (size, length, updated_at)
+                size += length
+            self.file.close()
+            self.file = new_file
+            self.entries = entries
+            self.size = size
+            self.garbage = 0
+
+    def close(self):
+        with self.lock:
+            self.file.close()
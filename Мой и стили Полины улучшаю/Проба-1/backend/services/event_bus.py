@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from collections import deque
+
+
+class Subscription:
+    """Очередь событий одного подписчика (например, одной открытой вкладки)"""
+
+    def __init__(self, bus, max_queue):
+        self.bus = bus
+        self.max_queue = max_queue
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.dropped = False
+
+    def push(self, event):
+        """Положить событие; False, если очередь переполнена и подписчик отключен"""
+        with self.condition:
+            if self.dropped:
+                return False
+            if len(self.queue) >= self.max_queue:
+                # Подписчик не успевает читать: вместо накопленных событий
+                # он получит одно "resync" и перезагрузит данные целиком
+                self.queue.clear()
+                self.queue.append(('resync', {}))
+                self.dropped = True
+            else:
+                self.queue.append(event)
+            self.condition.notify()
+            return not self.dropped
+
+    def get(self, timeout=None):
+        """Следующее событие (имя, данные); None по таймауту или после отключения"""
+        with self.condition:
+            if not self.queue and not self.dropped:
+                self.condition.wait(timeout)
+            if self.queue:
+                return self.queue.popleft()
+            return None
+
+    def closed(self):
+        with self.condition:
+            return self.dropped and not self.queue
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncSubscription(Subscription):
+    """Подписка для asyncio: ожидание события не занимает поток.
+
+    События публикуются из рабочих потоков, поэтому цикл событий
+    будится через call_soon_threadsafe.
+    """
+
+    def __init__(self, bus, max_queue, loop):
+        super().__init__(bus, max_queue)
+        self.loop = loop
+        self.ready = asyncio.Event()
+
+    def push(self, event):
+        pushed = super().push(event)
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            # Цикл событий уже закрыт - подписчик больше не нужен
+            return False
+        return pushed
+
+    async def get_async(self, timeout=None):
+        """Следующее событие; None по таймауту или после отключения"""
+        self.ready.clear()
+        event = self.get(timeout=0)
+        if event is not None or self.closed():
+            return event
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self.get(timeout=0)
+
+
+class EventBus:
+    """Рассылка событий об изменениях всем подписчикам в пределах процесса.
+
+    У каждого подписчика своя ограниченная очередь; publish никогда не ждет:
+    медленный подписчик отключается, а не тормозит запись.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self, loop=None):
+        """Новая подписка; с loop - AsyncSubscription для asyncio-приложения"""
+        if loop is None:
+            subscription = Subscription(self, self.max_queue)
+        else:
+            subscription = AsyncSubscription(self, self.max_queue, loop)
+        with self.lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, name, data):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            if not subscription.push((name, data)):
+                self.unsubscribe(subscription)
@@ -0,0 +1,245 @@
+import atexit
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from services.event_bus import EventBus
+from services.note_service import NoteService
+from services.label_service import LabelService
+from services.response_cache import ResponseCache
+from storage.json_storage import JsonNoteStorage, JsonLabelStorage
+from storage.binary_storage import BinaryNoteStorage
+from storage.sqlite_storage import SqliteDatabase, SqliteNoteStorage, SqliteLabelStorage
+from storage.group_commit import GroupCommitNoteStorage, GroupCommitLabelStorage
+
+
+# Настройки по умолчанию; переопределяются переменными окружения NOTES_<имя>
+DEFAULT_CONFIG = {
+    # Хранилище: json (файлы notes.json/labels.json) или sqlite (notes.db).
+    # С любым из них данные при запуске читаются в память целиком.
+    # Переопределяется переменной окружения NOTES_STORAGE_BACKEND=sqlite
+    'STORAGE_BACKEND': 'json',
+    # Формат снимка заметок для хранилища json: json (notes.json) или binary -
+    # notes.bin.N, который отображается в память и не разбирается целиком при старте.
+    # Существующий notes.json подхватывается и при binary; перевести снимок вручную -
+    # tools/convert_snapshot.py
+    'SNAPSHOT_FORMAT': 'json',
+    # Групповая запись: изменения сбрасываются на диск раз в COMMIT_WINDOW_MS
+    # или при COMMIT_MAX_PENDING накопленных изменениях; 0 - писать каждое сразу
+    'COMMIT_WINDOW_MS': 20,
+    'COMMIT_MAX_PENDING': 100,
+    # Сколько событий может ждать отправки одному подписчику /api/events,
+    # прежде чем он будет отключен как слишком медленный
+    'EVENTS_QUEUE_SIZE': 100,
+    # Объем кэша готовых ответов GET /api/notes в байтах; 0 - без кэша
+    'RESPONSE_CACHE_BYTES': 32 * 1024 * 1024,
+    # Сколько пространств (X-Workspace-Id или /api/w/<id>/...) держать в памяти одновременно
+    'WORKSPACES_MAX_LOADED': 100,
+}
+
+# id пространства - он же имя папки в data/workspaces
+WORKSPACE_ID_RE = re.compile(r'[A-Za-z0-9_-]{1,64}')
+# Второй способ выбрать пространство, кроме заголовка X-Workspace-Id: /api/w/<id>/notes -> /api/notes
+WORKSPACE_PATH_RE = re.compile(r'^/api/w/([^/]+)(/.*)$')
+
+
+def load_config(prefix='NOTES'):
+    """Настройки по умолчанию с учетом переменных окружения - как Flask config.from_prefixed_env"""
+    config = dict(DEFAULT_CONFIG)
+    prefix = f'{prefix}_'
+    for key, value in os.environ.items():
+        if not key.startswith(prefix):
+            continue
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        config[key[len(prefix):]] = value
+    return config
+
+
+class Workspace:
+    """Пространство (workspace): папка со своими заметками и метками и сервисы над ней"""
+
+    def __init__(self, config, data_dir, response_cache=None, sync_on_read=True):
+        os.makedirs(data_dir, exist_ok=True)
+        if config['STORAGE_BACKEND'] == 'sqlite':
+            database = SqliteDatabase(os.path.join(data_dir, 'notes.db'))
+            note_storage = SqliteNoteStorage(database)
+            label_storage = SqliteLabelStorage(database)
+        elif config['SNAPSHOT_FORMAT'] == 'binary':
+            note_storage = BinaryNoteStorage(os.path.join(data_dir, 'notes.bin'),
+                                             json_file=os.path.join(data_dir, 'notes.json'))
+            label_storage = JsonLabelStorage(os.path.join(data_dir, 'labels.json'))
+        else:
+            note_storage = JsonNoteStorage(os.path.join(data_dir, 'notes.json'))
+            label_storage = JsonLabelStorage(os.path.join(data_dir, 'labels.json'))
+        if config['COMMIT_WINDOW_MS']:
+            window = config['COMMIT_WINDOW_MS'] / 1000
+            note_storage = GroupCommitNoteStorage(note_storage, window, config['COMMIT_MAX_PENDING'])
+            label_storage = GroupCommitLabelStorage(label_storage, window, config['COMMIT_MAX_PENDING'])
+        self.response_cache = response_cache
+        self.event_bus = EventBus(config['EVENTS_QUEUE_SIZE'])
+        self.notes = NoteService(note_storage, events=self.event_bus, response_cache=response_cache,
+                                 archive_dir=data_dir)
+        self.labels = LabelService(label_storage, events=self.event_bus)
+        self.notes.sync_on_read = self.labels.sync_on_read = sync_on_read
+        # Метка в ETag: у каждого воркера и у каждой загрузки пространства свой счетчик поколений,
+        # поэтому ETag одной копии не должен совпасть с ETag другой
+        self.tag = os.urandom(4).hex()
+        # Сколько запросов сейчас работают с пространством
+        self.users = 0
+
+    def sync(self):
+        """Перечитать заметки и метки, если их изменил другой процесс"""
+        self.notes.sync()
+        self.labels.sync()
+
+    def get_labels_with_counts(self):
+        """Метки с числом заметок (count); число берется из индекса меток NoteService"""
+        counts = self.notes.get_label_counts()
+        labels = self.labels.get_labels()
+        for label in labels:
+            label['count'] = counts.get(label['name'], 0)
+        return labels
+
+    def delete_label(self, label_id):
+        """Удалить метку и убрать ее из заметок; False, если метки нет"""
+        label = self.labels.get_label(label_id)
+        if label is None:
+            return False
+        self.notes.remove_label_from_all_notes(label['name'])
+        self.labels.delete_label(label_id)
+        return True
+
+    def apply_labels_batch(self, operations):
+        """LabelService.apply_batch; удаленные метки убираются и из заметок"""
+        results = self.labels.apply_batch(operations)
+        for operation, result in zip(operations, results):
+            if result['ok'] and operation.get('op') == 'delete':
+                self.notes.remove_label_from_all_notes(result['label']['name'])
+        return results
+
+    def idle(self):
+        """Нет ни запросов, ни подписчиков /api/events - пространство можно выгрузить"""
+        return not self.users and not self.event_bus.subscribers
+
+    def close(self):
+        """Сохранить несброшенные изменения и закрыть хранилища"""
+        self.notes.close()
+        self.labels.close()
+        if self.response_cache is not None:
+            self.response_cache.close()
+
+
+class Services:
+    """Пространства приложения; одни и те же для Flask (app.py) и ASGI (asgi_app.py).
+
+    Запрос без id пространства работает с данными прямо в data_dir, как раньше.
+    Пространство с id лежит в data_dir/workspaces/<id> и загружается при первом
+    обращении; если загружено больше WORKSPACES_MAX_LOADED, простаивающие
+    выгружаются, начиная с давно не использованных.
+
+    sync_on_read=False - сервисы не проверяют диск при чтении; тогда перед
+    чтениями нужно вызывать Workspace.sync().
+    """
+
+    def __init__(self, config, data_dir, sync_on_read=True):
+        self.config = config
+        self.data_dir = str(data_dir)
+        self.sync_on_read = sync_on_read
+        self.max_loaded = config['WORKSPACES_MAX_LOADED']
+        # Один кэш ответов на все пространства; ключи каждого - в своем пространстве имен
+        cache_bytes = config['RESPONSE_CACHE_BYTES']
+        self.response_cache = ResponseCache(cache_bytes) if cache_bytes else None
+        self.default = Workspace(config, self.data_dir, self._cache_namespace(None), sync_on_read)
+        # id -> Workspace, от давно использованных к недавним
+        self.loaded = OrderedDict()
+        self.lock = threading.Lock()
+        # При остановке сервера сохраняем несброшенные изменения и закрываем хранилища
+        atexit.register(self.close)
+
+    def _cache_namespace(self, workspace_id):
+        if self.response_cache is None:
+            return None
+        return self.response_cache.namespace(workspace_id)
+
+    def acquire(self, workspace_id=None):
+        """Пространство для запроса; после запроса его нужно вернуть через release.
+
+        ValueError, если id пространства недопустим.
+        """
+        if not workspace_id:
+            with self.lock:
+                self.default.users += 1
+            return self.default
+        if not WORKSPACE_ID_RE.fullmatch(workspace_id):
+            raise ValueError('Invalid workspace id')
+        return self._acquire_loaded(workspace_id)
+
+    def release(self, workspace):
+        with self.lock:
+            workspace.users -= 1
+            evicted = self._evict()
+        self._close_all(evicted)
+
+    @contextmanager
+    def workspace(self, workspace_id=None):
+        workspace = self.acquire(workspace_id)
+        try:
+            yield workspace
+        finally:
+            self.release(workspace)
+
+    def _acquire_loaded(self, workspace_id):
+        with self.lock:
+            workspace = self.loaded.get(workspace_id)
+            if workspace is not None:
+                self.loaded.move_to_end(workspace_id)
+                workspace.users += 1
+                return workspace
+        # Загрузка читает диск - остальные пространства ее не ждут
+        loaded = Workspace(self.config, os.path.join(self.data_dir, 'workspaces', workspace_id),
+                           self._cache_namespace(workspace_id), self.sync_on_read)
+        with self.lock:
+            workspace = self.loaded.get(workspace_id)
+            if workspace is None:
+                workspace = self.loaded[workspace_id] = loaded
+                loaded = None
+            else:
+                self.loaded.move_to_end(workspace_id)
+            # Счетчик растет до вытеснения, иначе только что загруженное пространство выглядело бы простаивающим
+            workspace.users += 1
+            evicted = self._evict()
+        # Если пространство параллельно загрузил другой запрос, лишняя копия закрывается.
+        # Две копии одной папки безопасны: хранилища рассчитаны на несколько процессов
+        self._close_all(evicted + ([loaded] if loaded is not None else []))
+        return workspace
+
+    def _evict(self):
+        """Убрать из загруженных лишние простаивающие пространства (под self.lock)"""
+        evicted = []
+        excess = len(self.loaded) - self.max_loaded
+        for workspace_id, workspace in list(self.loaded.items()):
+            if excess <= 0:
+                break
+            if workspace.idle():
+                del self.loaded[workspace_id]
+                evicted.append(workspace)
+                excess -= 1
+        return evicted
+
+    def _close_all(self, workspaces):
+        for workspace in workspaces:
+            try:
+                workspace.close()
+            except Exception as e:
+                print(f"Error closing workspace: {e}")
+
+    def close(self):
+        with self.lock:
+            workspaces = [self.default] + list(self.loaded.values())
+            self.loaded.clear()
+        self._close_all(workspaces)
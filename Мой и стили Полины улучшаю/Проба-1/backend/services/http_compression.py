@@ -0,0 +1,93 @@
+"""Сжатие ответов API по заголовку Accept-Encoding (br, gzip) - общее для app.py и asgi_app.py"""
+import zlib
+
+try:
+    # brotli сжимает JSON плотнее gzip; без пакета отдаем только gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Меньшие ответы не сжимаем: заголовки и кадр сжатия съели бы выигрыш
+MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# text/event-stream не сжимаем: сжатие копит данные, и события приходили бы с задержкой
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson')
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encoding):
+    """'br', 'gzip' или None - лучшее из поддерживаемых сжатий, которые принимает клиент"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best = None
+    best_weight = 0.0
+    for encoding in supported_encodings():
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        # При равном весе выигрывает первый в списке - br
+        if weight > best_weight:
+            best = encoding
+            best_weight = weight
+    return best
+
+
+def is_compressible(content_type):
+    return (content_type or '').split(';')[0].strip() in COMPRESSIBLE_TYPES
+
+
+class Compressor:
+    """Потоковое сжатие: compress для каждого куска, flush в конце"""
+
+    def __init__(self, encoding):
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._compress = self._compressor.process
+            self._flush = self._compressor.finish
+        else:
+            # wbits=31 - формат gzip (заголовок и контрольная сумма)
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._compress = self._compressor.compress
+            self._flush = self._compressor.flush
+
+    def compress(self, data):
+        return self._compress(data)
+
+    def flush(self):
+        return self._flush()
+
+
+def weak_etag(etag):
+    """ETag сжатого ответа: сжатое тело отличается от несжатого побайтно, поэтому ETag слабый"""
+    if etag and not etag.startswith('W/'):
+        return 'W/' + etag
+    return etag
+
+
+def compress(encoding, data):
+    compressor = Compressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_chunks(encoding, chunks):
+    """Сжатые куски потокового ответа"""
+    compressor = Compressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
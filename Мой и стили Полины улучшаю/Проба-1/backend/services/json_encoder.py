@@ -0,0 +1,44 @@
+"""Быстрое кодирование JSON (orjson, если установлен) - без зависимости от Flask или Starlette"""
+import json
+
+try:
+    # orjson в несколько раз быстрее стандартного json; если его нет - работаем на json
+    import orjson
+except ImportError:
+    orjson = None
+
+
+STREAM_CHUNK_SIZE = 500
+
+
+def dumps(data):
+    """Компактный JSON-текст (без пробелов, кириллица не экранируется)"""
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(text):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def iter_json_list(items, encode=dumps, chunk_size=STREAM_CHUNK_SIZE):
+    """JSON-массив кусками: по chunk_size элементов за раз, без одной огромной строки.
+
+    encode превращает элемент в JSON-текст; если элементы уже закодированы,
+    передайте encode=str.
+    """
+    yield '['
+    chunk = []
+    first = True
+    for item in items:
+        chunk.append(encode(item))
+        if len(chunk) >= chunk_size:
+            yield ('' if first else ',') + ','.join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield ('' if first else ',') + ','.join(chunk)
+    yield ']'
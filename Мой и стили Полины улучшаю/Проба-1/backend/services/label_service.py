@@ -1,23 +1,88 @@
-import json
-import os
-#from models.label import Label
-from datetime import datetime
-from models.note import Note, NoteStatus
-from flask import Flask, jsonify, request
-from flask_cors import CORS
+import time
+from contextlib import contextmanager
+from models.label import Label
+from services.rw_lock import RWLock
+from storage.base import LabelStorage
+from storage.json_storage import JsonLabelStorage
 
 class LabelService:
-    def __init__(self, data_file):
-        self.data_file = data_file
-        self.labels = self._load_labels()
+    def __init__(self, storage, events=None):
+        # Можно передать путь к labels.json - тогда метки хранятся в JSON-файле
+        if not isinstance(storage, LabelStorage):
+            storage = JsonLabelStorage(storage)
+        self.storage = storage
+        # EventBus для уведомлений об изменениях (None - не уведомлять)
+        self.events = events
+        # Поколение меток: растет при каждом изменении (для ETag)
+        self.generation = 0
+        self.last_modified = time.time()
+        # Чтения идут параллельно, изменения - по одному
+        self.lock = RWLock()
+        # False - чтения не проверяют диск сами, перед ними вызывают sync() (см. NoteService)
+        self.sync_on_read = True
+        self.next_id = 1
+        with self.storage.lock():
+            self._set_labels(self._load_labels())
+        self.storage.commit()
     
+    def _sync(self):
+        """Перечитать метки, если их изменил другой процесс"""
+        if self.storage.has_changed():
+            with self.lock.write():
+                if self.storage.has_changed():
+                    self._set_labels(self._load_labels())
+                    self._touch()
+
+    def _set_labels(self, labels):
+        # id -> Label в порядке добавления и имя в нижнем регистре (casefold) -> Label
+        self.labels = {}
+        self.labels_by_name = {}
+        for label in labels:
+            self._add_label(label)
+        # Счетчик id только растет и хранится вместе с метками: id удаленных меток не выдаются снова
+        next_id = max((label.id for label in labels), default=0) + 1
+        self.next_id = max(self.next_id, self.storage.load_next_id(), next_id)
+
+    def sync(self):
+        self._sync()
+
+    @contextmanager
+    def _reading(self):
+        if self.sync_on_read:
+            self._sync()
+        with self.lock.read():
+            yield
+
+    @contextmanager
+    def _writing(self):
+        with self.lock.write(), self.storage.lock():
+            self._sync()
+            yield
+
+    def _add_label(self, label):
+        self.labels[label.id] = label
+        self.labels_by_name.setdefault(label.name.casefold(), label)
+
+    def _remove_label(self, label_id):
+        label = self.labels.pop(label_id, None)
+        if label is not None:
+            key = label.name.casefold()
+            if self.labels_by_name.get(key) is label:
+                del self.labels_by_name[key]
+        return label
+
+    def _publish(self, name, data):
+        if self.events is not None:
+            self.events.publish(name, data)
+
+    def _touch(self):
+        self.generation += 1
+        self.last_modified = time.time()
+
     def _load_labels(self):
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                pass
+        labels = self.storage.load()
+        if labels is not None:
+            return [Label.from_dict(label) for label in labels]
         default_labels = [
             {
                 "id": 1,
@@ -42,47 +107,147 @@ class LabelService:
 
 
         ]
-        self.labels = default_labels
-        self._save_labels()
-        return default_labels
-    
-    def _save_labels(self):
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.labels, f, indent=2, ensure_ascii=False)
+        self.storage.write_batch(default_labels, [], next_id=len(default_labels) + 1)
+        return [Label.from_dict(label) for label in default_labels]
     
+    def close(self):
+        self.storage.close()
+
+    def get_generation(self):
+        """(поколение, время последнего изменения) списка меток"""
+        if self.sync_on_read:
+            self._sync()
+        return self.generation, self.last_modified
+
     def get_labels(self):
-        return self.labels
+        with self._reading():
+            return [label.to_dict() for label in self.labels.values()]
+
+    def get_label(self, label_id):
+        with self._reading():
+            label = self.labels.get(label_id)
+            return label.to_dict() if label else None
+
+    def find_by_name(self, name):
+        """Метка с таким именем без учета регистра или None"""
+        with self._reading():
+            label = self.labels_by_name.get(name.strip().casefold())
+            return label.to_dict() if label else None
+
+    def get_labels_json(self):
+        """Список меток сразу в JSON, из сохраненных фрагментов"""
+        with self._reading():
+            return '[' + ','.join(label.to_json() for label in self.labels.values()) + ']'
 
     def create_label(self, name, color=None):
-        name = name.strip()
-    
+        with self._writing():
+            label, created = self._create_label(name.strip())
+            if created:
+                self.storage.write_batch([label.to_dict()], [], next_id=self.next_id)
+        self.storage.commit()
+        if created:
+            self._publish('label_created', label.to_dict())
+        return label.to_dict()
+
+    def _create_label(self, name):
         # Проверяем, нет ли уже метки с таким именем
-        existing_label = next((label for label in self.labels if label['name'].lower() == name.lower()), None)
+        existing_label = self.labels_by_name.get(name.casefold())
         if existing_label:
-            return existing_label  # Возвращаем существующую метку
+            return existing_label, False  # Возвращаем существующую метку
     
         # Генерируем новый ID
-        label_id = max([label['id'] for label in self.labels], default=0) + 1
+        label_id = self.next_id
+        self.next_id += 1
     
         # Автоматически выбираем цвет из палитры
         colors = ["#3498db", "#e74c3c", "#f39c12", "#9b59b6", 
                  "#1abc9c", "#34495e", "#e67e22", "#16a085"]
         color = colors[(label_id - 1) % len(colors)]
     
-        new_label = {
-            "id": label_id,
-            "name": name,
-            "color": color
-        }
+        new_label = Label(id=label_id, name=name, color=color)
     
-        self.labels.append(new_label)
-        self._save_labels()
-        return new_label
+        self._add_label(new_label)
+        self._touch()
+        return new_label, True
         
     
     def delete_label(self, label_id):
         """Удалить метку"""
-        self.labels = [label for label in self.labels if label['id'] != label_id]
-        self._save_labels()
-        return True
\ No newline at end of file
+        with self._writing():
+            deleted = self._remove_label(label_id) is not None
+            if deleted:
+                self._touch()
+                self.storage.write_batch([], [label_id], next_id=self.next_id)
+        self.storage.commit()
+        if deleted:
+            self._publish('label_deleted', {'id': label_id})
+        return deleted
+
+    def apply_batch(self, operations):
+        """Выполнить список операций с метками с одной записью на диск.
+
+        Операции: {"op": "create", "name"}, {"op": "delete", "id"}.
+        """
+        # Все метки уже есть - писать нечего, хватает блокировки на чтение
+        existing = self._find_existing(operations)
+        if existing is not None:
+            return existing
+        results = []
+        puts = {}
+        deletes = set()
+        with self._writing():
+            for operation in operations:
+                try:
+                    results.append(self._apply_operation(operation, puts, deletes))
+                except (ValueError, TypeError) as e:
+                    results.append({'ok': False, 'error': str(e)})
+            self.storage.write_batch([label.to_dict() for label in puts.values()], sorted(deletes),
+                                     next_id=self.next_id)
+        self.storage.commit()
+        for result in results:
+            if not result['ok']:
+                continue
+            if result.get('created'):
+                self._publish('label_created', result['label'])
+            elif 'created' not in result:
+                self._publish('label_deleted', {'id': result['label']['id']})
+        return results
+
+    def _find_existing(self, operations):
+        """Результаты пакета, если он только создает уже существующие метки, иначе None"""
+        with self._reading():
+            results = []
+            for operation in operations:
+                if not isinstance(operation, dict) or operation.get('op') != 'create':
+                    return None
+                name = operation.get('name')
+                label = self.labels_by_name.get(name.strip().casefold()) if isinstance(name, str) else None
+                if label is None:
+                    return None
+                results.append({'ok': True, 'label': label.to_dict(), 'created': False})
+            return results
+
+    def _apply_operation(self, operation, puts, deletes):
+        if not isinstance(operation, dict):
+            raise ValueError('Operation must be an object')
+        op = operation.get('op')
+        if op == 'create':
+            name = operation.get('name')
+            if not isinstance(name, str) or not name.strip():
+                raise ValueError('Label name is required')
+            label, created = self._create_label(name.strip())
+            if created:
+                puts[label.id] = label
+            return {'ok': True, 'label': label.to_dict(), 'created': created}
+        if op == 'delete':
+            if 'id' not in operation:
+                raise ValueError('id is required')
+            label_id = int(operation['id'])
+            label = self._remove_label(label_id)
+            if label is None:
+                raise ValueError('Label not found')
+            self._touch()
+            puts.pop(label_id, None)
+            deletes.add(label_id)
+            return {'ok': True, 'label': label.to_dict()}
+        raise ValueError(f'Unknown operation: {op}')
\ No newline at end of file
@@ -1,90 +1,617 @@
+import base64
+import bisect
 import json
 import os
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
 from datetime import datetime
 from models.note import Note, NoteStatus
-from flask import Flask, jsonify, request
-from flask_cors import CORS
+from services import json_encoder
+from services.cold_store import ColdStore
+from services.rw_lock import RWLock
+from services.search_index import SearchIndex
+from storage.base import NoteStorage
+from storage.json_storage import JsonNoteStorage
 
 
+NOTE_FIELDS = ('id', 'title', 'content', 'status', 'labels', 'created_at', 'updated_at')
+MAX_PAGE_SIZE = 500
+# Сколько последних изменений помнит журнал для /api/notes/changes
+CHANGE_LOG_SIZE = 10000
+
+
+def encode_cursor(key):
+    """Курсор страницы: ключ (updated_at, id) последней выданной заметки"""
+    raw = json.dumps(list(key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        updated_at, note_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(updated_at), int(note_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
 
 class NoteService:
-    def __init__(self, data_file):
-        self.data_file = data_file
-        self.notes = self._load_notes()
-    
+    def __init__(self, storage, compact_interval=30.0, events=None, response_cache=None, archive_dir=None):
+        # Можно передать путь к notes.json - тогда данные хранятся в JSON-файлах
+        if not isinstance(storage, NoteStorage):
+            storage = JsonNoteStorage(storage, compact_interval=compact_interval)
+        self.storage = storage
+        # EventBus для уведомлений об изменениях (None - не уведомлять)
+        self.events = events
+        # ResponseCache готовых ответов GET /api/notes по фильтрам (None - без кэша)
+        self.response_cache = response_cache
+        # Архивные заметки читают редко - они лежат не в памяти, а во временном файле в archive_dir
+        # (None - системная папка для временных файлов) и подгружаются по одной
+        self.archive = ColdStore(archive_dir)
+        # Поколение данных: растет при каждом изменении заметок (для ETag)
+        self.generation = 0
+        self.last_modified = time.time()
+        # Ревизия - "метка процесса.поколение"; у каждого процесса свой счетчик поколений
+        self.instance_id = os.urandom(4).hex()
+        # Журнал последних изменений: (поколение, id заметки), по записи на каждое поколение
+        self.change_log = deque(maxlen=CHANGE_LOG_SIZE)
+        self.change_log_start = 0
+        # Чтения идут параллельно, изменения - по одному (Flask и ASGI обслуживают запросы в потоках)
+        self.lock = RWLock()
+        # False - чтения не проверяют диск сами, перед ними вызывают sync() (так делает asgi_app:
+        # перечитывание идет в пуле потоков, а не в цикле событий)
+        self.sync_on_read = True
+        self.next_id = 1
+        self._reload()
+
+    def _reload(self):
+        """Прочитать все заметки из хранилища и построить индексы заново"""
+        notes = self._load_notes()
+        # id -> Note для всех заметок, кроме архивных; словарь хранит порядок добавления,
+        # поэтому служит и списком заметок
+        self.notes = {}
+        # False - в self.notes есть заметка, добавленная после заметок с большим id
+        # (вернулась из архива или импортирована со своим id); тогда список сортируется при выдаче
+        self.notes_in_order = True
+        self.archive.clear()
+        # Вторичные индексы: статус -> id заметок, имя метки -> id заметок
+        self.notes_by_status = defaultdict(set)
+        self.notes_by_label = defaultdict(set)
+        # Ключи (updated_at, id), отсортированные по возрастанию - для постраничной выдачи
+        self.notes_by_updated = []
+        # Те же ключи для заметок под фильтром: (статус, метка) -> отсортированный список.
+        # Строятся при первом запросе страницы и сбрасываются при любом изменении
+        self.page_keys = {}
+        # Полнотекстовый индекс по заголовку и содержанию строится при первом поиске:
+        # иначе загрузка читала бы текст всех заметок, в том числе из двоичного снимка
+        self.search_index = None
+        for note in notes.values():
+            self._index_note(note, keep_sorted=False)
+            self._place(note)
+        self.notes_by_updated.sort()
+        if self.response_cache is not None:
+            self.response_cache.clear()
+        # Счетчик id только растет и хранится вместе с заметками: id удаленных заметок не выдаются снова.
+        # В старых данных счетчика нет - тогда он продолжается после наибольшего id
+        self.next_id = max(self.next_id, self.storage.load_next_id(), max(notes, default=0) + 1)
+        self._touch()
+        # Что поменялось при перечитывании, неизвестно - старые ревизии требуют полной загрузки
+        self.change_log.clear()
+        self.change_log_start = self.generation
+
     def _load_notes(self):
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    notes = []
-                    for note_data in data:
-                        #     JSON
-                        note = Note(
-                            id=note_data['id'],
-                            title=note_data['title'],
-                            content=note_data['content'],
-                            status=note_data.get('status', NoteStatus.ACTIVE),
-                            labels=note_data.get('labels', []),
-                            created_at=note_data.get('created_at'),
-                            updated_at=note_data.get('updated_at')
-                        )
-                        notes.append(note)
-                    return notes
-            except Exception as e:
-                print(f"Error loading notes: {e}")
-                return []
-        return []
-    
-    def _save_notes(self):
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump([note.to_dict() for note in self.notes], f, indent=2, ensure_ascii=False)
-    
-    def get_notes(self, status_filter=None, label_filter=None):
-        filtered_notes = self.notes
+        notes = {}
+        for note_data in self.storage.load():
+            # Двоичный снимок сразу отдает заметки (LazyNote), журнал - словари
+            note = note_data if isinstance(note_data, Note) else self._note_from_dict(note_data)
+            notes[note.id] = note
+        return notes
+
+    def _note_from_dict(self, note_data):
+        return Note(
+            id=note_data['id'],
+            title=note_data['title'],
+            content=note_data['content'],
+            status=note_data.get('status', NoteStatus.ACTIVE),
+            labels=note_data.get('labels', []),
+            created_at=note_data.get('created_at'),
+            updated_at=note_data.get('updated_at')
+        )
+
+    def _index_note(self, note, keep_sorted=True):
+        self.notes_by_status[note.status].add(note.id)
+        for label in note.labels:
+            self.notes_by_label[label].add(note.id)
+        if keep_sorted:
+            bisect.insort(self.notes_by_updated, (note.updated_at, note.id))
+            self._invalidate_cache(note)
+        else:
+            self.notes_by_updated.append((note.updated_at, note.id))
+
+    def _place(self, note):
+        """Оставить заметку в памяти или, если она архивная, перенести в холодное хранилище"""
+        if note.status == NoteStatus.ARCHIVED:
+            self.notes.pop(note.id, None)
+            self.archive.put(note)
+        else:
+            self.archive.remove(note.id)
+            if note.id not in self.notes and self.notes and next(reversed(self.notes)) > note.id:
+                # Заметка встает в конец словаря, а не на свое место по id: пересортировка
+                # под блокировкой записи стоила бы O(n log n) на каждое изменение
+                self.notes_in_order = False
+            self.notes[note.id] = note
+
+    def _find(self, note_id):
+        """Заметка по id: из памяти или, если она в архиве, прочитанная с диска"""
+        note = self.notes.get(note_id)
+        if note is None and note_id in self.archive:
+            note = self._note_from_dict(json_encoder.loads(self.archive.read(note_id)))
+        return note
+
+    def _note_json(self, note_id):
+        note = self.notes.get(note_id)
+        # JSON архивной заметки берется из файла как есть, без разбора
+        return note.to_json() if note is not None else self.archive.read(note_id)
+
+    def _updated_key(self, note_id):
+        note = self.notes.get(note_id)
+        return (note.updated_at if note is not None else self.archive.updated_at(note_id)), note_id
+
+    def _unindex_note(self, note):
+        self._invalidate_cache(note)
+        self._discard(self.notes_by_status, note.status, note.id)
+        for label in note.labels:
+            self._discard(self.notes_by_label, label, note.id)
+        key = (note.updated_at, note.id)
+        i = bisect.bisect_left(self.notes_by_updated, key)
+        if i < len(self.notes_by_updated) and self.notes_by_updated[i] == key:
+            del self.notes_by_updated[i]
+
+    def _invalidate_cache(self, note):
+        """Убрать из кэша списки, в которые попадает заметка: без фильтров, по ее статусу и меткам"""
+        if self.response_cache is None:
+            return
+        keys = [(None, None), (note.status, None)]
+        for label in note.labels:
+            keys += [(None, label), (note.status, label)]
+        self.response_cache.invalidate(keys)
+
+    def _note_text(self, note):
+        return f"{note.title}\n{note.content}"
+
+    def _touch(self, note_id=None):
+        self.generation += 1
+        self.last_modified = time.time()
+        self.page_keys = {}
+        if note_id is not None:
+            if len(self.change_log) == self.change_log.maxlen:
+                # Самая старая запись вытесняется - изменения до нее больше не восстановить
+                self.change_log_start = self.change_log[0][0]
+            self.change_log.append((self.generation, note_id))
+
+    def _publish(self, name, data):
+        # Вызывается после commit(): подписчики узнают только о записанных изменениях
+        if self.events is not None:
+            self.events.publish(name, data)
+
+    def _discard(self, index, key, note_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(note_id)
+            if not ids:
+                del index[key]
+
+    def _sync(self):
+        """Перечитать данные, если их изменил другой процесс (например, другой воркер gunicorn)"""
+        if self.storage.has_changed():
+            with self.lock.write():
+                # Пока ждали блокировку, данные мог перечитать другой поток
+                if self.storage.has_changed():
+                    self._reload()
+
+    def sync(self):
+        self._sync()
+
+    @contextmanager
+    def _reading(self):
+        # _sync до блокировки чтения: перечитывание берет блокировку записи
+        if self.sync_on_read:
+            self._sync()
+        with self.lock.read():
+            yield
+
+    @contextmanager
+    def _writing(self):
+        # Порядок всегда один: сначала блокировка сервиса, потом блокировка хранилища
+        with self.lock.write(), self.storage.lock():
+            self._sync()
+            yield
+
+    def _allocate_id(self):
+        note_id = self.next_id
+        self.next_id += 1
+        return note_id
+
+    def compact(self):
+        self.storage.compact()
+
+    def close(self):
+        self.storage.close()
+        self.archive.close()
+
+    def get_generation(self):
+        """(поколение, время последнего изменения) - меняются при любом изменении заметок"""
+        if self.sync_on_read:
+            self._sync()
+        return self.generation, self.last_modified
+
+    def get_revision(self):
+        if self.sync_on_read:
+            self._sync()
+        return f'{self.instance_id}.{self.generation}'
+
+    def get_changes(self, since):
+        """Изменения после ревизии since: {revision, notes, deleted}.
+
+        notes - созданные и измененные заметки в текущем виде, deleted - id удаленных.
+        None, если ревизия из другого процесса или старше журнала - нужна полная загрузка.
+        """
+        instance_id, _, generation = since.partition('.')
+        try:
+            generation = int(generation)
+        except ValueError:
+            raise ValueError('Invalid revision')
+        with self._reading():
+            if instance_id != self.instance_id or generation < self.change_log_start or generation > self.generation:
+                return None
+            changed = {}
+            for change_generation, note_id in reversed(self.change_log):
+                if change_generation <= generation:
+                    break
+                changed.setdefault(note_id, change_generation)
+            # От старых изменений к новым
+            notes = []
+            deleted = []
+            for note_id in sorted(changed, key=changed.get):
+                note = self._find(note_id)
+                if note is not None:
+                    notes.append(note.to_dict())
+                else:
+                    deleted.append(note_id)
+            return {'revision': f'{self.instance_id}.{self.generation}', 'notes': notes, 'deleted': deleted}
+
+    def get_note(self, note_id):
+        with self._reading():
+            note = self._find(note_id)
+            return note.to_dict() if note else None
+
+    def _filter_ids(self, status_filter, label_filter):
+        """id заметок под фильтрами (None - фильтров нет)"""
+        ids = None
         if status_filter:
-            filtered_notes = [n for n in filtered_notes if n.status == status_filter]
+            ids = self.notes_by_status.get(status_filter, set())
         if label_filter:
-            filtered_notes = [n for n in filtered_notes if label_filter in n.labels]
-        return [note.to_dict() for note in filtered_notes]
-    
-    def create_note(self, title, content, labels=None):
-        note_id = max([n.id for n in self.notes], default=0) + 1
+            label_ids = self.notes_by_label.get(label_filter, set())
+            ids = label_ids if ids is None else ids & label_ids
+        return ids
+
+    def _list_ids(self, status_filter, label_filter):
+        """id заметок для списка по порядку; None - нужны все заметки, и self.notes уже в этом порядке"""
+        ids = self._filter_ids(status_filter, label_filter)
+        if ids is None:
+            if not self.archive and self.notes_in_order:
+                return None
+            # Архивные заметки лежат не в self.notes - список собирается из обоих
+            ids = set(self.notes).union(self.archive.ids())
+        # id растут в порядке создания, так что сортировка сохраняет порядок списка
+        return sorted(ids)
+
+    def _project(self, note_id, fields):
+        """Заметка словарем; с fields - только эти поля.
+
+        content читается (и сжатый текст распаковывается), только если он запрошен.
+        """
+        note = self.notes.get(note_id)
+        if note is None:
+            # Архивная заметка: поля берутся из ее JSON в файле, без создания Note
+            data = json_encoder.loads(self.archive.read(note_id))
+            return {key: data[key] for key in fields} if fields else data
+        if fields:
+            return {key: getattr(note, key) for key in fields}
+        return note.to_dict()
+
+    def _check_fields(self, fields):
+        unknown = [field for field in fields or [] if field not in NOTE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    def get_notes(self, status_filter=None, label_filter=None, fields=None):
+        self._check_fields(fields)
+        with self._reading():
+            ids = self._list_ids(status_filter, label_filter)
+            if ids is None:
+                return [self._project(note_id, fields) for note_id in self.notes]
+            return [self._project(note_id, fields) for note_id in ids]
+
+    def get_notes_json(self, status_filter=None, label_filter=None):
+        """То же, что get_notes без fields, но сразу строкой JSON.
+
+        Список склеивается из сохраненных в заметках фрагментов - заново
+        сериализуются только заметки, изменившиеся с прошлого запроса.
+        """
+        return b''.join(self.iter_notes_json(status_filter, label_filter)).decode('utf-8')
+
+    def iter_notes_json(self, status_filter=None, label_filter=None):
+        """Список заметок в JSON кусками bytes - для потоковой отдачи больших списков.
+
+        С кэшем ответов готовое тело берется из него; иначе собирается и, если
+        помещается в кэш, сохраняется там до изменения подходящей заметки.
+        """
+        key = (status_filter or None, label_filter or None)
+        with self._reading():
+            if self.response_cache is not None:
+                body = self.response_cache.get(key)
+                if body is not None:
+                    return [body]
+            ids = self._list_ids(status_filter, label_filter)
+            # Фрагменты берутся под блокировкой (обычно это готовые строки из кэша заметок),
+            # а склеиваются и отдаются уже без нее
+            if ids is None:
+                fragments = [note.to_json() for note in self.notes.values()]
+            else:
+                fragments = [self._note_json(note_id) for note_id in ids]
+            if self.response_cache is not None:
+                body = ('[' + ','.join(fragments) + ']').encode('utf-8')
+                # Кладем под блокировкой чтения: изменение не может проскочить между сборкой и записью
+                self.response_cache.put(key, body)
+                return [body]
+        return (chunk.encode('utf-8') for chunk in json_encoder.iter_json_list(fragments, encode=str))
+
+    def get_cache_stats(self):
+        """Счетчики кэша ответов этого сервиса; None, если кэш выключен"""
+        return self.response_cache.stats() if self.response_cache is not None else None
+
+    def get_notes_page(self, status_filter=None, label_filter=None, limit=50, cursor=None, fields=None):
+        """Страница заметок, от недавно измененных к старым"""
+        self._check_fields(fields)
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+        with self._reading():
+            key = (status_filter or None, label_filter or None)
+            keys = self.page_keys.get(key)
+            if keys is None:
+                ids = self._filter_ids(status_filter, label_filter)
+                if ids is None:
+                    keys = self.notes_by_updated
+                else:
+                    # Сортируем один раз на фильтр, следующие страницы только ищут курсор
+                    keys = sorted(self._updated_key(note_id) for note_id in ids)
+                    self.page_keys[key] = keys
+
+            end = bisect.bisect_left(keys, decode_cursor(cursor)) if cursor else len(keys)
+            start = max(end - limit, 0)
+            page = keys[start:end][::-1]
+            return {
+                'notes': [self._project(note_id, fields) for _, note_id in page],
+                'next_cursor': encode_cursor(page[-1]) if start > 0 else None
+            }
+
+    def search_notes(self, query, limit=20, fields=None):
+        """Заметки, подходящие под запрос, от самых релевантных"""
+        self._check_fields(fields)
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+        with self._reading():
+            return [self._project(note_id, fields) for note_id, _ in self._get_search_index().search(query, limit)]
+
+    def _get_search_index(self):
+        """Полнотекстовый индекс; при первом обращении строится по всем заметкам"""
+        search_index = self.search_index
+        if search_index is None:
+            # Под блокировкой чтения индекс могут построить два потока сразу - останется любой из равных
+            search_index = SearchIndex()
+            for note in self.notes.values():
+                search_index.add(note.id, self._note_text(note))
+            # Архивные заметки ищутся тоже: в индексе только слова, текст остается в файле
+            for note_id in self.archive.ids():
+                search_index.add(note_id, self._note_text(self._find(note_id)))
+            self.search_index = search_index
+        return search_index
+
+    def _add(self, note):
+        self._index_note(note)
+        self._place(note)
+        if self.search_index is not None:
+            self.search_index.add(note.id, self._note_text(note))
+        self._touch(note.id)
+
+    def _create(self, title, content, labels):
+        note_id = self._allocate_id()
         current_time = datetime.now().isoformat()
         note = Note(
-            id=note_id, 
-            title=title, 
-            content=content, 
+            id=note_id,
+            title=title,
+            content=content,
             labels=labels or [],
             created_at=current_time,
             updated_at=current_time
         )
-        self.notes.append(note)
-        self._save_notes()
-        return note.to_dict()
-    
-    def update_note(self, note_id, **kwargs):
-        note = next((n for n in self.notes if n.id == note_id), None)
+        self._add(note)
+        return note
+
+    def _update(self, note_id, changes):
+        note = self._find(note_id)
         if not note:
             return None
-        
-        for key, value in kwargs.items():
+
+        self._unindex_note(note)
+        for key, value in changes.items():
             if value is not None and hasattr(note, key):
                 setattr(note, key, value)
-        
-        #  updated_at
+
+        # Обновляем updated_at
         note.updated_at = datetime.now().isoformat()
-        self._save_notes()
-        return note.to_dict()
-    
+        self._index_note(note)
+        self._place(note)
+        if self.search_index is not None:
+            if changes.get('title') is not None or changes.get('content') is not None:
+                self.search_index.add(note_id, self._note_text(note))
+        self._touch(note_id)
+        return note
+
+    def _delete(self, note_id):
+        note = self._find(note_id)
+        if note is not None:
+            self.notes.pop(note_id, None)
+            self.archive.remove(note_id)
+            self._unindex_note(note)
+            if self.search_index is not None:
+                self.search_index.remove(note_id)
+            self._touch(note_id)
+        return note
+
+    def create_note(self, title, content, labels=None):
+        with self._writing():
+            note = self._create(title, content, labels)
+            result = note.to_dict()
+            # В хранилище уходит to_record: длинный текст там остается сжатым, без повторного сжатия
+            self.storage.write_batch([note.to_record()], [], next_id=self.next_id)
+        # Ответ уходит только после того, как изменение записано на диск
+        self.storage.commit()
+        self._publish('note_created', result)
+        return result
+
+    def update_note(self, note_id, **kwargs):
+        with self._writing():
+            note = self._update(note_id, kwargs)
+            if not note:
+                return None
+            result = note.to_dict()
+            self.storage.put(note.to_record())
+        self.storage.commit()
+        self._publish('note_updated', result)
+        return result
+
     def delete_note(self, note_id):
-        self.notes = [n for n in self.notes if n.id != note_id]
-        self._save_notes()
+        with self._writing():
+            deleted = self._delete(note_id) is not None
+            if deleted:
+                # Счетчик пишется и при удалении: в старых данных его еще нет на диске
+                self.storage.write_batch([], [note_id], next_id=self.next_id)
+        self.storage.commit()
+        if deleted:
+            self._publish('note_deleted', {'id': note_id})
+
+    def apply_batch(self, operations):
+        """Выполнить список операций под одной блокировкой и с одной записью на диск.
+
+        Операции: {"op": "create", "title", "content", "labels"},
+        {"op": "update", "id", ...изменяемые поля}, {"op": "delete", "id"}.
+        Ошибка в одной операции не отменяет остальные - результат возвращается для каждой.
+        """
+        results = []
+        puts = {}
+        deletes = set()
+        with self._writing():
+            for operation in operations:
+                try:
+                    results.append(self._apply_operation(operation, puts, deletes))
+                except (ValueError, TypeError) as e:
+                    results.append({'ok': False, 'error': str(e)})
+            self.storage.write_batch([note.to_record() for note in puts.values()], sorted(deletes),
+                                     next_id=self.next_id)
+        self.storage.commit()
+        for operation, result in zip(operations, results):
+            if result['ok']:
+                if 'note' in result:
+                    name = 'note_created' if operation['op'] == 'create' else 'note_updated'
+                    self._publish(name, result['note'])
+                else:
+                    self._publish('note_deleted', {'id': result['id']})
+        return results
+
+    def import_notes(self, notes, keep_ids=False):
+        """Добавить пачку проверенных заметок (Note) одной записью на диск.
+
+        По умолчанию заметки получают новые id; с keep_ids=True заметка
+        со своим id заменяет существующую с тем же id.
+        """
+        with self._writing():
+            for note in notes:
+                if keep_ids and note.id is not None:
+                    self._delete(note.id)
+                    self.next_id = max(self.next_id, note.id + 1)
+                else:
+                    note.id = self._allocate_id()
+                self._add(note)
+            self.storage.write_batch([note.to_record() for note in notes], [], next_id=self.next_id)
+        self.storage.commit()
+        if notes:
+            self._publish('notes_imported', {'count': len(notes)})
+        return len(notes)
+
+    def export_notes(self, chunk_size=500):
+        """Заметки по одной (генератор) - для потоковой выгрузки"""
+        with self._reading():
+            note_ids = list(self.notes) + self.archive.ids()
+        # Блокировка берется на каждую пачку, а не на всю выгрузку - запись не ждет медленного клиента
+        for start in range(0, len(note_ids), chunk_size):
+            with self.lock.read():
+                notes = [self._find(note_id) for note_id in note_ids[start:start + chunk_size]]
+                chunk = [note.to_dict() for note in notes if note is not None]
+            yield from chunk
+
+    def _apply_operation(self, operation, puts, deletes):
+        if not isinstance(operation, dict):
+            raise ValueError('Operation must be an object')
+        op = operation.get('op')
+        if op == 'create':
+            Note.check_fields(operation)
+            note = self._create(operation['title'], operation.get('content', ''), operation.get('labels', []))
+        elif op in ('update', 'delete'):
+            if 'id' not in operation:
+                raise ValueError('id is required')
+            note_id = int(operation['id'])
+            if op == 'delete':
+                if self._delete(note_id) is None:
+                    raise ValueError('Note not found')
+                puts.pop(note_id, None)
+                deletes.add(note_id)
+                return {'ok': True, 'id': note_id}
+            Note.check_fields(operation, partial=True)
+            changes = {key: operation.get(key) for key in ('title', 'content', 'status', 'labels')}
+            note = self._update(note_id, changes)
+            if note is None:
+                raise ValueError('Note not found')
+        else:
+            raise ValueError(f'Unknown operation: {op}')
+        puts[note.id] = note
+        return {'ok': True, 'note': note.to_dict()}
+
+    def get_label_counts(self):
+        """Имя метки -> сколько заметок ее носят (из индекса, без обхода заметок)"""
+        with self._reading():
+            return {label: len(note_ids) for label, note_ids in self.notes_by_label.items()}
+
     def remove_label_from_all_notes(self, label_name):
-    
-        for note in self.notes:
-            if label_name in note.labels:
-                note.labels.remove(label_name)
-                note.updated_at = datetime.now().isoformat()
-        self._save_notes()
\ No newline at end of file
+        """Убрать метку из заметок; изменяются и записываются только заметки с этой меткой"""
+        with self._writing():
+            note_ids = sorted(self.notes_by_label.get(label_name, ()))
+            # Одно время изменения на всю операцию
+            current_time = datetime.now().isoformat()
+            changed = []
+            for note_id in note_ids:
+                note = self._find(note_id)
+                self._unindex_note(note)
+                note.labels = [label for label in note.labels if label != label_name]
+                note.updated_at = current_time
+                self._index_note(note)
+                self._place(note)
+                self._touch(note_id)
+                changed.append(note.to_record())
+            if changed:
+                self.storage.write_batch(changed, [])
+        self.storage.commit()
+        if note_ids:
+            self._publish('label_removed', {'label': label_name, 'ids': note_ids})
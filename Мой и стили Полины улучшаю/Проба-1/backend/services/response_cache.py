@@ -0,0 +1,163 @@
+import threading
+from collections import OrderedDict
+
+
+# Память записи сверх тела и строк ключа: узел OrderedDict, кортежи ключа, объект bytes.
+# Без этой добавки тысячи пустых ответов ("[]" на ?label=<что угодно>) не упирались бы в лимит
+ENTRY_OVERHEAD = 256
+COUNTERS = ('entries', 'bytes', 'hits', 'misses', 'evictions', 'invalidations')
+
+
+def key_size(key):
+    """Сколько байт в строках ключа (ключ - строка или вложенные кортежи)"""
+    if isinstance(key, tuple):
+        return sum(key_size(part) for part in key)
+    return len(key) if isinstance(key, str) else 0
+
+
+class ResponseCache:
+    """LRU-кэш готовых тел ответов (bytes) с ограничением по суммарному размеру.
+
+    Размер записи - тело, строки ключа и ENTRY_OVERHEAD. Ключи - кортежи фильтров;
+    сервис сам удаляет записи, которых касается изменение.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # ключ -> (тело, пространство имен, учтенный размер)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Те же счетчики по пространствам имен (CacheNamespace); None - записи без пространства
+        self.namespaces = {}
+
+    def _count(self, namespace, counter, n=1):
+        counters = self.namespaces.get(namespace)
+        if counters is None:
+            counters = self.namespaces[namespace] = dict.fromkeys(COUNTERS, 0)
+        counters[counter] += n
+
+    def _remove(self, key):
+        """Убрать запись (под self.lock) и вернуть ее; None, если записи нет"""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            _, namespace, size = entry
+            self.size -= size
+            self._count(namespace, 'entries', -1)
+            self._count(namespace, 'bytes', -size)
+        return entry
+
+    def get(self, key, namespace=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                self._count(namespace, 'misses')
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self._count(namespace, 'hits')
+            return entry[0]
+
+    def put(self, key, body, namespace=None):
+        size = len(body) + key_size(key) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            # Слишком большой ответ вытеснил бы весь кэш - такой не храним
+            return
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (body, namespace, size)
+            self.size += size
+            self._count(namespace, 'entries')
+            self._count(namespace, 'bytes', size)
+            while self.size > self.max_bytes:
+                _, evicted_namespace, _ = self._remove(next(iter(self.entries)))
+                self.evictions += 1
+                self._count(evicted_namespace, 'evictions')
+
+    def invalidate(self, keys):
+        with self.lock:
+            for key in keys:
+                entry = self._remove(key)
+                if entry is not None:
+                    self.invalidations += 1
+                    self._count(entry[1], 'invalidations')
+
+    def clear(self):
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.size = 0
+            for counters in self.namespaces.values():
+                counters['invalidations'] += counters['entries']
+                counters['entries'] = counters['bytes'] = 0
+
+    def namespace(self, name):
+        """Часть кэша со своими ключами - для сервиса одного пространства"""
+        return CacheNamespace(self, name)
+
+    def clear_namespace(self, name):
+        with self.lock:
+            keys = [key for key, (_, namespace, _) in self.entries.items() if namespace == name]
+        self.invalidate(keys)
+
+    def drop_namespace(self, name):
+        """Убрать записи и счетчики пространства имен - когда его пространство выгружено"""
+        with self.lock:
+            for key in [key for key, (_, namespace, _) in self.entries.items() if namespace == name]:
+                self._remove(key)
+            self.namespaces.pop(name, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+    def namespace_stats(self, name):
+        """Те же счетчики, что stats, но только по записям пространства имен; max_bytes - общий"""
+        with self.lock:
+            counters = dict(self.namespaces.get(name) or dict.fromkeys(COUNTERS, 0))
+        counters['max_bytes'] = self.max_bytes
+        return counters
+
+
+class CacheNamespace:
+    """Пространство имен в общем ResponseCache: ключ хранится как (name, key).
+
+    Поддерживает тот же набор методов, что ResponseCache, поэтому NoteService
+    работает с ним как с отдельным кэшем, а лимит по объему остается общим.
+    Счетчики в stats - только этого пространства.
+    """
+
+    def __init__(self, cache, name):
+        self.cache = cache
+        self.name = name
+
+    def get(self, key):
+        return self.cache.get((self.name, key), self.name)
+
+    def put(self, key, body):
+        self.cache.put((self.name, key), body, self.name)
+
+    def invalidate(self, keys):
+        self.cache.invalidate([(self.name, key) for key in keys])
+
+    def clear(self):
+        self.cache.clear_namespace(self.name)
+
+    def close(self):
+        self.cache.drop_namespace(self.name)
+
+    def stats(self):
+        return self.cache.namespace_stats(self.name)
@@ -0,0 +1,102 @@
+import bisect
+import heapq
+import math
+import re
+from collections import Counter
+
+
+TOKEN_RE = re.compile(r'\w+')
+# Сколько слов словаря подставляется вместо одного префикса; берутся самые частые
+MAX_PREFIX_TERMS = 50
+
+
+def tokenize(text):
+    """Разбить текст на слова в нижнем регистре (ё приравнивается к е)"""
+    return TOKEN_RE.findall(text.casefold().replace('ё', 'е'))
+
+
+class SearchIndex:
+    """Инвертированный индекс для полнотекстового поиска с ранжированием BM25"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}     # слово -> {id документа: сколько раз встречается}
+        self.doc_terms = {}    # id документа -> Counter его слов
+        self.doc_lengths = {}  # id документа -> число слов
+        self.vocabulary = []   # отсортированный список слов для поиска по префиксу
+        self.vocabulary_dirty = True  # при первичной загрузке список строится один раз, при первом поиске
+        self.total_length = 0
+
+    def add(self, doc_id, text):
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        self.doc_terms[doc_id] = terms
+        self.doc_lengths[doc_id] = sum(terms.values())
+        self.total_length += self.doc_lengths[doc_id]
+        for term, count in terms.items():
+            docs = self.postings.get(term)
+            if docs is None:
+                docs = self.postings[term] = {}
+                if not self.vocabulary_dirty:
+                    bisect.insort(self.vocabulary, term)
+            docs[doc_id] = count
+
+    def remove(self, doc_id):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        for term in terms:
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+                if not self.vocabulary_dirty:
+                    del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+
+    def _expand(self, prefix):
+        """Слова словаря, начинающиеся с prefix: не больше MAX_PREFIX_TERMS, от встречающихся в большем числе документов"""
+        if self.vocabulary_dirty:
+            self.vocabulary = sorted(self.postings)
+            self.vocabulary_dirty = False
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = start
+        while end < len(self.vocabulary) and self.vocabulary[end].startswith(prefix):
+            end += 1
+        terms = self.vocabulary[start:end]
+        if len(terms) <= MAX_PREFIX_TERMS:
+            return terms
+        # Первые по алфавиту отбросили бы частые слова ради редких - отбираем по числу документов
+        return heapq.nlargest(MAX_PREFIX_TERMS, terms, key=lambda term: len(self.postings[term]))
+
+    def search(self, query, limit=20):
+        """Список (id, score) по убыванию релевантности.
+
+        Слово запроса со звездочкой на конце (раб*) ищется по префиксу.
+        """
+        doc_count = len(self.doc_terms)
+        if not doc_count:
+            return []
+        avg_length = self.total_length / doc_count or 1
+
+        terms = set()
+        for raw in query.split():
+            for token in tokenize(raw):
+                if raw.endswith('*'):
+                    terms.update(self._expand(token))
+                else:
+                    terms.add(token)
+
+        scores = {}
+        for term in terms:
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
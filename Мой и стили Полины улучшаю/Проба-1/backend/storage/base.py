@@ -0,0 +1,90 @@
+from contextlib import nullcontext
+
+
+class NoteStorage:
+    """Хранилище заметок: сервис держит данные в памяти, хранилище их сохраняет"""
+
+    def load(self):
+        """Все сохраненные заметки - список словарей"""
+        raise NotImplementedError
+
+    def load_next_id(self):
+        """Сохраненный счетчик id (следующий свободный id) на момент последнего load(); 0 - счетчика нет"""
+        return 0
+
+    def put(self, note):
+        """Сохранить заметку (словарь), новую или измененную"""
+        raise NotImplementedError
+
+    def delete(self, note_id):
+        raise NotImplementedError
+
+    def set_next_id(self, next_id):
+        """Сохранить счетчик id; счетчик не уменьшается, поэтому id удаленных заметок не выдаются снова"""
+        raise NotImplementedError
+
+    def write_batch(self, puts, deletes, next_id=None):
+        """Сохранить пачку изменений (и счетчик id, если он передан) за одну запись на диск"""
+        for note in puts:
+            self.put(note)
+        for note_id in deletes:
+            self.delete(note_id)
+        if next_id is not None:
+            self.set_next_id(next_id)
+
+    def commit(self):
+        """Дождаться, пока изменения текущего потока окажутся на диске"""
+
+    def lock(self):
+        """Блокировка на время изменения, общая для всех процессов с этими данными"""
+        return nullcontext()
+
+    def has_changed(self):
+        """Изменились ли данные (другим процессом) с последнего load()"""
+        return False
+
+    def compact(self):
+        """Привести файлы хранилища к компактному виду (если это нужно)"""
+
+    def close(self):
+        pass
+
+
+class LabelStorage:
+    """Хранилище меток"""
+
+    def load(self):
+        """Список меток или None, если хранилище еще пустое"""
+        raise NotImplementedError
+
+    def load_next_id(self):
+        return 0
+
+    def put(self, label):
+        raise NotImplementedError
+
+    def delete(self, label_id):
+        raise NotImplementedError
+
+    def set_next_id(self, next_id):
+        raise NotImplementedError
+
+    def write_batch(self, puts, deletes, next_id=None):
+        for label in puts:
+            self.put(label)
+        for label_id in deletes:
+            self.delete(label_id)
+        if next_id is not None:
+            self.set_next_id(next_id)
+
+    def commit(self):
+        pass
+
+    def lock(self):
+        return nullcontext()
+
+    def has_changed(self):
+        return False
+
+    def close(self):
+        pass
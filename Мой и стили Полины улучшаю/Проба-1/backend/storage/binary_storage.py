@@ -0,0 +1,219 @@
+"""Двоичный снимок заметок notes.bin, который читается через mmap.
+
+Формат (little-endian):
+    заголовок   - b'NOTEBIN2', число заметок (u32), next_id (u64)
+    оглавление  - на каждую заметку: id (u64), смещение записи (u64)
+    записи      - status, updated_at, labels (u32 - сколько меток, затем метки),
+                  затем created_at, title, content
+
+Каждый снимок пишется в новый файл: notes.bin.1, notes.bin.2, ... - текущий
+тот, у которого номер больше (notes.bin без номера - самый старый). Файл,
+отображенный в память, на Windows нельзя ни подменить, ни удалить, поэтому
+старые снимки удаляются, когда получится, а до тех пор просто не читаются.
+
+Каждая строка - UTF-8 с длиной u32 впереди; content - тоже с длиной впереди,
+но в виде storage.compression.text_to_bytes (длинный текст - сжатым). В старом
+формате NOTEBIN1 content - обычная строка. Поля для индексов (статус, метки,
+дата изменения) лежат в начале записи и читаются при загрузке, а заголовок,
+текст и дата создания - только при первом обращении к ним.
+"""
+import mmap
+import os
+import struct
+from models.note import Note
+from storage.compression import text_from_bytes, text_to_bytes
+from storage.json_storage import JsonNoteStorage, file_version, read_json_snapshot, write_file_atomic
+
+
+MAGIC = b'NOTEBIN2'
+MAGIC_V1 = b'NOTEBIN1'
+HEADER = struct.Struct('<8sIQ')
+ENTRY = struct.Struct('<QQ')
+LENGTH = struct.Struct('<I')
+
+
+def _pack_string(parts, value):
+    _pack_bytes(parts, value.encode('utf-8'))
+
+
+def _pack_bytes(parts, data):
+    parts.append(LENGTH.pack(len(data)))
+    parts.append(data)
+
+
+def write_snapshot(path, notes, next_id):
+    """Записать заметки (словари, content может быть сжат) в двоичный снимок; файл подменяется атомарно"""
+    notes = list(notes)
+    records = []
+    entries = []
+    offset = HEADER.size + ENTRY.size * len(notes)
+    for note in notes:
+        parts = []
+        _pack_string(parts, note['status'])
+        _pack_string(parts, note['updated_at'])
+        parts.append(LENGTH.pack(len(note['labels'])))
+        for label in note['labels']:
+            _pack_string(parts, label)
+        _pack_string(parts, note['created_at'])
+        _pack_string(parts, note['title'])
+        _pack_bytes(parts, text_to_bytes(note['content']))
+        record = b''.join(parts)
+        entries.append(ENTRY.pack(note['id'], offset))
+        records.append(record)
+        offset += len(record)
+    data = b''.join([HEADER.pack(MAGIC, len(notes), next_id)] + entries + records)
+    write_file_atomic(path, data)
+
+
+def snapshot_files(path):
+    """Файлы снимка path от старых к новым: [(номер, путь)], сам path - номер 0"""
+    directory, name = os.path.split(os.path.abspath(str(path)))
+    if not os.path.isdir(directory):
+        return []
+    files = []
+    for entry in os.listdir(directory):
+        if entry == name:
+            files.append((0, os.path.join(directory, entry)))
+        elif entry.startswith(name + '.') and entry[len(name) + 1:].isdigit():
+            files.append((int(entry[len(name) + 1:]), os.path.join(directory, entry)))
+    return sorted(files)
+
+
+def current_snapshot(path):
+    """Путь к последнему снимку или None, если снимков еще нет"""
+    files = snapshot_files(path)
+    return files[-1][1] if files else None
+
+
+def write_new_snapshot(path, notes, next_id):
+    """Записать снимок в следующий по номеру файл и удалить предыдущие.
+
+    Старый файл не подменяется: его могут держать отображенным в память
+    LazyNote этого и других процессов.
+    """
+    files = snapshot_files(path)
+    write_snapshot(f'{path}.{files[-1][0] + 1 if files else 1}', notes, next_id)
+    for _, old_path in files:
+        try:
+            os.remove(old_path)
+        except OSError:
+            # Windows: файл еще отображен в память - удалим при следующем сжатии
+            pass
+
+
+class BinarySnapshot:
+    """Открытый через mmap снимок; страницы файла подгружает ОС по мере чтения"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            # Отображение не зависит от файлового дескриптора, его можно закрыть сразу
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.next_id = HEADER.unpack_from(self.map, 0)
+        if magic not in (MAGIC, MAGIC_V1):
+            raise ValueError(f'{path} is not a notes snapshot')
+        self.compressed = magic == MAGIC
+
+    def _bytes(self, offset):
+        (length,) = LENGTH.unpack_from(self.map, offset)
+        offset += LENGTH.size
+        return self.map[offset:offset + length], offset + length
+
+    def _string(self, offset):
+        data, offset = self._bytes(offset)
+        return data.decode('utf-8'), offset
+
+    def notes(self):
+        """Заметки снимка; заголовок, текст и дата создания читаются лениво"""
+        for index in range(self.count):
+            note_id, offset = ENTRY.unpack_from(self.map, HEADER.size + ENTRY.size * index)
+            status, offset = self._string(offset)
+            updated_at, offset = self._string(offset)
+            (count,) = LENGTH.unpack_from(self.map, offset)
+            offset += LENGTH.size
+            labels = []
+            for _ in range(count):
+                label, offset = self._string(offset)
+                labels.append(label)
+            yield LazyNote(self, offset, note_id, status, labels, updated_at)
+
+    def read_body(self, offset):
+        """created_at, title и content (строка или CompressedText) записи, которые начинаются с offset"""
+        created_at, offset = self._string(offset)
+        title, offset = self._string(offset)
+        if self.compressed:
+            data, offset = self._bytes(offset)
+            return created_at, title, text_from_bytes(data)
+        content, offset = self._string(offset)
+        return created_at, title, content
+
+
+class LazyNote(Note):
+    """Заметка из двоичного снимка: title, content и created_at читаются из mmap при первом обращении.
+
+    content хранится в слоте _content (см. Note.content), поэтому лениво заполняется именно он.
+    """
+
+    __slots__ = ('_snapshot', '_offset')
+
+    def __init__(self, snapshot, offset, id, status, labels, updated_at):
+        object.__setattr__(self, '_snapshot', snapshot)
+        object.__setattr__(self, '_offset', offset)
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'status', status)
+        object.__setattr__(self, 'labels', labels)
+        object.__setattr__(self, 'updated_at', updated_at)
+        object.__setattr__(self, '_json', None)
+
+    def __getattr__(self, name):
+        # Сюда попадаем только для еще не заполненных слотов
+        if name not in ('created_at', 'title', '_content'):
+            raise AttributeError(name)
+        values = dict(zip(('created_at', 'title', '_content'), self._snapshot.read_body(self._offset)))
+        for field, value in values.items():
+            # Поле, которое уже успели изменить, не затираем значением из снимка
+            try:
+                object.__getattribute__(self, field)
+            except AttributeError:
+                object.__setattr__(self, field, value)
+        return object.__getattribute__(self, name)
+
+
+class BinaryNoteStorage(JsonNoteStorage):
+    """Двоичный снимок notes.bin плюс тот же журнал notes.wal, что у JsonNoteStorage.
+
+    Снимок не разбирается при загрузке, а отображается в память: старт не зависит
+    от объема текста заметок. Пока двоичного снимка нет, снимком служит json_file
+    (старый notes.json); первое сжатие запишет уже notes.bin.1.
+    """
+
+    def __init__(self, data_file, compact_interval=30.0, json_file=None):
+        self.json_file = json_file
+        super().__init__(data_file, compact_interval)
+
+    def _version(self):
+        # Новый снимок - новый файл, поэтому в отпечаток входит и его имя
+        path = current_snapshot(self.data_file)
+        return (path,) + file_version(path or self.data_file, self.journal.path)
+
+    def _read_snapshot(self):
+        for attempt in range(3):
+            path = current_snapshot(self.data_file)
+            if path is None:
+                if self.json_file:
+                    return read_json_snapshot(self.json_file)
+                return {}, 0
+            try:
+                snapshot = BinarySnapshot(path)
+                return {note.id: note for note in snapshot.notes()}, snapshot.next_id
+            except FileNotFoundError:
+                # Другой процесс успел записать новый снимок и удалить этот - читаем новый
+                if attempt == 2:
+                    raise
+            except Exception as e:
+                print(f"Error loading notes: {e}")
+                raise
+
+    def _write_snapshot(self):
+        notes, next_id = self._read()
+        notes = [note.to_record() if isinstance(note, Note) else note for note in notes]
+        write_new_snapshot(self.data_file, notes, next_id)
@@ -0,0 +1,110 @@
+"""Сжатие длинных текстов заметок (content) в памяти и в хранилищах.
+
+Текст длиннее COMPRESS_THRESHOLD символов хранится как CompressedText
+и распаковывается только при обращении к нему. Как он записывается:
+    JSON (notes.json, notes.wal) - {"codec": "zstd", "data": "<base64>"}
+    notes.bin и SQLite           - bytes: номер кодека (1 байт) и сжатые данные
+"""
+import base64
+import zlib
+
+try:
+    # zstd быстрее zlib и при распаковке, и при сжатии; если пакета нет - сжимаем zlib
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Короткие тексты не сжимаем: выигрыш мал, а каждое чтение стало бы дороже
+COMPRESS_THRESHOLD = 8 * 1024
+# Сжатый текст должен быть хотя бы на 10% меньше исходного, иначе храним как есть
+MIN_RATIO = 0.9
+CODEC = 'zstd' if zstandard is not None else 'zlib'
+CODEC_IDS = {'zlib': 1, 'zstd': 2}
+CODEC_NAMES = {codec_id: codec for codec, codec_id in CODEC_IDS.items()}
+
+
+def _compress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor().compress(data)
+    return zlib.compress(data)
+
+
+def _decompress(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard package is required to read zstd-compressed notes')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class CompressedText:
+    """Сжатый текст; в памяти лежит сжатым и распаковывается при каждом обращении"""
+
+    __slots__ = ('codec', 'data')
+
+    def __init__(self, codec, data):
+        self.codec = codec
+        self.data = data
+
+    def text(self):
+        return _decompress(self.codec, self.data).decode('utf-8')
+
+    def to_json(self):
+        return {'codec': self.codec, 'data': base64.b64encode(self.data).decode('ascii')}
+
+    @classmethod
+    def from_json(cls, value):
+        return cls(value['codec'], base64.b64decode(value['data']))
+
+    def to_bytes(self):
+        return bytes([CODEC_IDS[self.codec]]) + self.data
+
+    @classmethod
+    def from_bytes(cls, raw):
+        return cls(CODEC_NAMES[raw[0]], bytes(raw[1:]))
+
+
+def compress_text(value):
+    """CompressedText для длинного текста; короткий, плохо сжимаемый или уже сжатый - как есть"""
+    if not isinstance(value, str) or len(value) < COMPRESS_THRESHOLD:
+        return value
+    raw = value.encode('utf-8')
+    data = _compress(CODEC, raw)
+    if len(data) > len(raw) * MIN_RATIO:
+        return value
+    return CompressedText(CODEC, data)
+
+
+def encode_note(note):
+    """Запись заметки для JSON-файлов: длинный content сжимается"""
+    content = note['content']
+    if isinstance(content, dict):
+        return note
+    content = compress_text(content)
+    if isinstance(content, CompressedText):
+        return dict(note, content=content.to_json())
+    return note
+
+
+def decode_note(note):
+    """Запись из JSON-файлов: сжатый content становится CompressedText (без распаковки)"""
+    if isinstance(note['content'], dict):
+        return dict(note, content=CompressedText.from_json(note['content']))
+    return note
+
+
+def text_to_bytes(value):
+    """content для двоичных форматов: 0 и UTF-8 для обычного текста, иначе CompressedText.to_bytes"""
+    if isinstance(value, dict):
+        value = CompressedText.from_json(value)
+    value = compress_text(value)
+    if isinstance(value, CompressedText):
+        return value.to_bytes()
+    return b'\x00' + value.encode('utf-8')
+
+
+def text_from_bytes(raw):
+    if raw[0] == 0:
+        return bytes(raw[1:]).decode('utf-8')
+    return CompressedText.from_bytes(raw)
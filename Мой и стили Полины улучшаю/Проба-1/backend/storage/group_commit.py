@@ -0,0 +1,240 @@
+import collections
+import threading
+import time
+from contextlib import contextmanager
+from storage.base import NoteStorage, LabelStorage
+
+
+class _Batch:
+    """Пачка изменений, которые уйдут на диск одной записью"""
+
+    def __init__(self):
+        self.changes = {}  # id -> ('put', данные) или ('delete', None); последнее изменение побеждает
+        self.next_id = None  # наибольшее из переданных значений счетчика id
+        self.done = threading.Event()
+        self.error = None
+
+    def empty(self):
+        return not self.changes and self.next_id is None
+
+
+class _Call:
+    """Вызов хранилища, который выполнит поток записи - владелец блокировки"""
+
+    def __init__(self, func):
+        self.func = func
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self.func()
+        except Exception as e:
+            self.error = e
+        self.done.set()
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class GroupCommit:
+    """Групповая запись: изменения копятся и сбрасываются в хранилище раз в window секунд
+    или сразу, как только их набралось max_pending.
+
+    Межпроцессную блокировку хранилища берет поток записи и держит ее от первого
+    lock() пачки до записи этой пачки на диск. Иначе другой процесс успел бы
+    изменить файлы между изменением в памяти и его записью, и id бы совпали.
+    Блокировки хранилищ привязаны к потоку, поэтому, пока она взята, обращения
+    к хранилищу (load, has_changed) тоже выполняет поток записи.
+
+    put/delete только ставят изменение в очередь; commit() ждет записи пачки,
+    в которую попали изменения текущего потока.
+    """
+
+    def __init__(self, storage, window=0.02, max_pending=100):
+        self.storage = storage
+        self.window = window
+        self.max_pending = max_pending
+        self._batch = _Batch()
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._calls = collections.deque()
+        self._held = False  # поток записи держит блокировку хранилища
+        self._draining = False  # окно закончилось: новых писателей не пускаем до записи пачки
+        self._lock_requested = False
+        self._lock_error = None
+        self._inside = 0  # писателей внутри lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+        self._thread.start()
+
+    def _call(self, func):
+        """Выполнить func там, где это можно при взятой блокировке хранилища"""
+        with self._condition:
+            if self._held and threading.current_thread() is not self._thread:
+                call = _Call(func)
+                self._calls.append(call)
+                self._condition.notify_all()
+            else:
+                call = None
+        if call is None:
+            return func()
+        return call.wait()
+
+    def load(self):
+        return self._call(self.storage.load)
+
+    def load_next_id(self):
+        return self.storage.load_next_id()
+
+    @contextmanager
+    def lock(self):
+        depth = getattr(self._local, 'depth', 0)
+        if not depth:
+            with self._condition:
+                while not self._held or self._draining:
+                    if self._lock_error is not None:
+                        error, self._lock_error = self._lock_error, None
+                        raise error
+                    self._lock_requested = True
+                    self._condition.notify_all()
+                    self._condition.wait()
+                self._inside += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if not depth:
+                with self._condition:
+                    self._inside -= 1
+                    self._condition.notify_all()
+
+    def has_changed(self):
+        # Пока есть несброшенные изменения, данные в памяти новее диска - не перечитываем
+        with self._condition:
+            if not self._batch.empty():
+                return False
+        return self._call(self.storage.has_changed)
+
+    def _submit(self, item_id, change):
+        with self._condition:
+            self._batch.changes[item_id] = change
+            self._local.batch = self._batch
+            self._condition.notify_all()
+
+    def put(self, item):
+        self._submit(item['id'], ('put', item))
+
+    def delete(self, item_id):
+        self._submit(item_id, ('delete', None))
+
+    def set_next_id(self, next_id):
+        with self._condition:
+            batch = self._batch
+            batch.next_id = next_id if batch.next_id is None else max(batch.next_id, next_id)
+            self._local.batch = batch
+            self._condition.notify_all()
+
+    def write_batch(self, puts, deletes, next_id=None):
+        for item in puts:
+            self.put(item)
+        for item_id in deletes:
+            self.delete(item_id)
+        if next_id is not None:
+            self.set_next_id(next_id)
+
+    def commit(self):
+        batch = getattr(self._local, 'batch', None)
+        if batch is None:
+            return
+        self._local.batch = None
+        batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._lock_requested and self._batch.empty() and not self._closed:
+                    self._condition.wait()
+                if not self._lock_requested and self._batch.empty():
+                    return
+            try:
+                with self.storage.lock():
+                    batch = self._collect()
+                    self._flush(batch)
+            except Exception as e:
+                # Не удалось взять блокировку: писатели, которые ее ждут, получат ошибку
+                print(f"Error locking storage: {e}")
+                with self._condition:
+                    self._held = False
+                    self._draining = False
+                    if self._lock_requested:
+                        self._lock_requested = False
+                        self._lock_error = e
+                    batch, self._batch = self._batch, _Batch()
+                    self._condition.notify_all()
+                batch.error = e
+                batch.done.set()
+
+    def _collect(self):
+        """Держать блокировку, пока идет окно и внутри lock() есть писатели; вернуть готовую пачку"""
+        with self._condition:
+            self._held = True
+            self._lock_requested = False
+            self._condition.notify_all()
+            deadline = time.monotonic() + self.window
+            while True:
+                if self._calls:
+                    call = self._calls.popleft()
+                    self._condition.release()
+                    try:
+                        call.run()
+                    finally:
+                        self._condition.acquire()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or len(self._batch.changes) >= self.max_pending or self._closed:
+                    self._draining = True
+                if self._draining and not self._inside:
+                    batch, self._batch = self._batch, _Batch()
+                    # Дальнейшие обращения к хранилищу снова идут напрямую
+                    self._held = False
+                    self._draining = False
+                    return batch
+                self._condition.wait(None if self._draining else remaining)
+
+    def _flush(self, batch):
+        puts = [data for action, data in batch.changes.values() if action == 'put']
+        deletes = [item_id for item_id, (action, _) in batch.changes.items() if action == 'delete']
+        try:
+            if not batch.empty():
+                self.storage.write_batch(puts, deletes, batch.next_id)
+        except Exception as e:
+            print(f"Error writing batch: {e}")
+            batch.error = e
+        batch.done.set()
+
+    def compact(self):
+        self.storage.compact()
+
+    def close(self):
+        """Сбросить оставшиеся изменения и закрыть хранилище"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.storage.close()
+
+
+class GroupCommitNoteStorage(GroupCommit, NoteStorage):
+    pass
+
+
+class GroupCommitLabelStorage(GroupCommit, LabelStorage):
+    pass
@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+
+
+class Journal:
+    """Журнал изменений (write-ahead log): по одной JSON-строке на изменение"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def replay(self):
+        """Прочитать записи журнала по порядку"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Оборванная запись (сбой во время дозаписи); следующие строки - целые записи
+                    print(f"Journal {self.path}: skipping broken record at line {line_no}")
+                    continue
+                yield record
+
+    def append(self, record):
+        """Дописать запись в конец журнала и сбросить её на диск"""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Дописать несколько записей одной операцией записи и одним fsync"""
+        data = ''.join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+                       for record in records).encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, 'ab+')
+            self._cut_torn_tail()
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _cut_torn_tail(self):
+        """Отрезать оборванную последнюю запись, если процесс упал посреди дозаписи.
+
+        Иначе новая запись склеилась бы с ней в одну битую строку и пропала при чтении.
+        Дозапись идет под блокировкой хранилища, так что чужой незаконченной записи здесь нет.
+        """
+        f = self._file
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        # Ищем конец последней целой записи с конца файла
+        end = size
+        keep = 0
+        while end > 0:
+            start = max(0, end - 64 * 1024)
+            f.seek(start)
+            pos = f.read(end - start).rfind(b'\n')
+            if pos != -1:
+                keep = start + pos + 1
+                break
+            end = start
+        print(f"Journal {self.path}: cutting broken record at byte {keep}")
+        f.truncate(keep)
+        f.flush()
+        os.fsync(f.fileno())
+
+    def compact(self, write_snapshot):
+        """Записать полный снимок и очистить журнал"""
+        with self._lock:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                return
+            write_snapshot()
+            # Обрезаем на месте: файл может быть открыт на дозапись другими процессами
+            with open(self.path, 'r+', encoding='utf-8') as f:
+                f.truncate(0)
+                os.fsync(f.fileno())
+
+    def start_compaction(self, compact, interval=30.0):
+        """Периодически вызывать compact() в фоновом потоке"""
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    compact()
+                except Exception as e:
+                    print(f"Error compacting journal: {e}")
+
+        self._thread = threading.Thread(target=run, name='journal-compaction', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Остановить фоновое сжатие и закрыть файл"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
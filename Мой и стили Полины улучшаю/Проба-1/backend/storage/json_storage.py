@@ -0,0 +1,232 @@
+import json
+import os
+import tempfile
+import threading
+from storage.base import NoteStorage, LabelStorage
+from storage.compression import decode_note, encode_note
+from storage.file_lock import FileLock
+from storage.journal import Journal
+
+
+def write_json_atomic(path, data, **kwargs):
+    """Записать JSON во временный файл рядом и подменить им path.
+
+    При сбое посреди записи старый файл остается целым.
+    """
+    write_file_atomic(path, json.dumps(data, ensure_ascii=False, **kwargs).encode('utf-8'))
+
+
+def write_file_atomic(path, data):
+    """Записать bytes во временный файл рядом и подменить им path"""
+    directory = os.path.dirname(str(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def file_version(*paths):
+    """Отпечаток файлов (inode, mtime, размер): меняется при любой записи"""
+    version = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            version.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+
+def read_items(data, key):
+    """Записи и счетчик id из файла: {"next_id": ..., key: [...]} или старый формат - просто список"""
+    if isinstance(data, dict):
+        return data[key], data.get('next_id', 0)
+    return data, 0
+
+
+def read_json_snapshot(path):
+    """Заметки из снимка notes.json (id -> словарь) и счетчик id; пустой результат, если файла нет"""
+    notes = {}
+    next_id = 0
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                items, next_id = read_items(json.load(f), 'notes')
+                for note_data in items:
+                    notes[note_data['id']] = note_data
+        except Exception as e:
+            # Снимок пишется атомарно, так что битый файл - повод остановиться, а не начать с пустого списка
+            print(f"Error loading notes: {e}")
+            raise
+    return notes, next_id
+
+
+class JsonNoteStorage(NoteStorage):
+    """Снимок notes.json плюс журнал изменений notes.wal"""
+
+    def __init__(self, data_file, compact_interval=30.0):
+        self.data_file = data_file
+        # Изменения дописываются в notes.wal, полный notes.json пишется только при сжатии
+        self.journal = Journal(os.path.splitext(str(data_file))[0] + '.wal')
+        self.file_lock = FileLock(str(data_file) + '.lock')
+        # Запись в файлы и обновление version идут под этой блокировкой, и has_changed ее ждет:
+        # иначе посреди своей записи файл уже новый, а version еще старая - и читатель перечитал бы все
+        self.version_lock = threading.Lock()
+        self.version = None
+        self.next_id = 0
+        if compact_interval:
+            self.journal.start_compaction(self.compact, interval=compact_interval)
+
+    def _read_snapshot(self):
+        """Заметки из снимка (id -> запись) и сохраненный в нем счетчик id"""
+        return read_json_snapshot(self.data_file)
+
+    def _read(self):
+        """Заметки и счетчик id из снимка и журнала"""
+        notes, next_id = self._read_snapshot()
+        # Досчитываем изменения, которые не попали в снимок
+        for record in self.journal.replay():
+            if record['op'] == 'put':
+                notes[record['note']['id']] = record['note']
+            elif record['op'] == 'delete':
+                notes.pop(record['id'], None)
+            elif record['op'] == 'next_id':
+                next_id = max(next_id, record['next_id'])
+        return list(notes.values()), next_id
+
+    def load(self):
+        # Отпечаток берем до чтения: запись, случившаяся во время чтения, будет замечена
+        self.version = self._version()
+        notes, self.next_id = self._read()
+        # Сжатый текст остается сжатым - его распакует сама заметка при обращении
+        return [decode_note(note) if isinstance(note, dict) else note for note in notes]
+
+    def load_next_id(self):
+        return self.next_id
+
+    def _write_snapshot(self):
+        """Собрать снимок из старого снимка и журнала и записать его в notes.json"""
+        notes, next_id = self._read()
+        write_json_atomic(self.data_file, {'next_id': next_id, 'notes': notes}, indent=2)
+
+    def lock(self):
+        return self.file_lock
+
+    def _version(self):
+        """Отпечаток снимка и журнала"""
+        return file_version(self.data_file, self.journal.path)
+
+    def has_changed(self):
+        with self.version_lock:
+            return self._changed()
+
+    def _changed(self):
+        return self._version() != self.version
+
+    def _append(self, records):
+        with self.file_lock, self.version_lock:
+            changed = self._changed()
+            self.journal.append_many(records)
+            if not changed:
+                self.version = self._version()
+
+    def put(self, note):
+        self._append([{'op': 'put', 'note': encode_note(note)}])
+
+    def delete(self, note_id):
+        self._append([{'op': 'delete', 'id': note_id}])
+
+    def set_next_id(self, next_id):
+        self._append([{'op': 'next_id', 'next_id': next_id}])
+
+    def write_batch(self, puts, deletes, next_id=None):
+        records = [{'op': 'put', 'note': encode_note(note)} for note in puts]
+        records += [{'op': 'delete', 'id': note_id} for note_id in deletes]
+        if next_id is not None:
+            records.append({'op': 'next_id', 'next_id': next_id})
+        if records:
+            self._append(records)
+
+    def compact(self):
+        with self.file_lock, self.version_lock:
+            changed = self._changed()
+            self.journal.compact(self._write_snapshot)
+            if not changed:
+                self.version = self._version()
+
+    def close(self):
+        """Остановить фоновое сжатие и сохранить снимок"""
+        self.journal.close()
+        self.compact()
+
+
+class JsonLabelStorage(LabelStorage):
+    """Все метки в одном файле labels.json"""
+
+    def __init__(self, data_file):
+        self.data_file = data_file
+        self.file_lock = FileLock(str(data_file) + '.lock')
+        self.version_lock = threading.Lock()
+        self.labels = {}
+        self.next_id = 0
+        self.version = None
+
+    def load(self):
+        self.version = file_version(self.data_file)
+        if not os.path.exists(self.data_file):
+            self.labels = {}
+            self.next_id = 0
+            return None
+        try:
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                labels, self.next_id = read_items(json.load(f), 'labels')
+                self.labels = {label['id']: label for label in labels}
+        except Exception as e:
+            print(f"Error loading labels: {e}")
+            raise
+        return list(self.labels.values())
+
+    def load_next_id(self):
+        return self.next_id
+
+    def lock(self):
+        return self.file_lock
+
+    def has_changed(self):
+        with self.version_lock:
+            return file_version(self.data_file) != self.version
+
+    def _save_labels(self):
+        with self.file_lock, self.version_lock:
+            data = {'next_id': self.next_id, 'labels': list(self.labels.values())}
+            write_json_atomic(self.data_file, data, indent=2)
+            self.version = file_version(self.data_file)
+
+    def put(self, label):
+        self.labels[label['id']] = dict(label)
+        self._save_labels()
+
+    def delete(self, label_id):
+        self.labels.pop(label_id, None)
+        self._save_labels()
+
+    def set_next_id(self, next_id):
+        self.next_id = max(self.next_id, next_id)
+        self._save_labels()
+
+    def write_batch(self, puts, deletes, next_id=None):
+        for label in puts:
+            self.labels[label['id']] = dict(label)
+        for label_id in deletes:
+            self.labels.pop(label_id, None)
+        if next_id is not None:
+            self.next_id = max(self.next_id, next_id)
+        self._save_labels()
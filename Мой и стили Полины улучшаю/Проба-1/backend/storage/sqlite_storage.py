@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from storage.base import NoteStorage, LabelStorage
+from storage.compression import CompressedText, compress_text
+
+
+# SQLite здесь - только надежное хранилище. При запуске заметки и метки читаются
+# в память целиком, и фильтры, страницы и поиск обслуживают индексы NoteService.
+# Памяти и времени запуска SQLite поэтому не экономит, а запросов по статусу,
+# метке или дате к базе нет - нет и вторичных индексов
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS note_labels (
+    note_id INTEGER NOT NULL REFERENCES notes (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    PRIMARY KEY (note_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS labels (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    color TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    next_id INTEGER NOT NULL
+);
+"""
+
+# Запросы с параметрами: sqlite3 кэширует подготовленные выражения по тексту запроса
+SELECT_NOTES = "SELECT id, title, content, status, created_at, updated_at FROM notes ORDER BY id"
+SELECT_NOTE_LABELS = "SELECT note_id, label FROM note_labels ORDER BY note_id, position"
+UPSERT_NOTE = """
+INSERT INTO notes (id, title, content, status, created_at, updated_at)
+VALUES (:id, :title, :content, :status, :created_at, :updated_at)
+ON CONFLICT (id) DO UPDATE SET
+    title = excluded.title,
+    content = excluded.content,
+    status = excluded.status,
+    created_at = excluded.created_at,
+    updated_at = excluded.updated_at
+"""
+DELETE_NOTE_LABELS = "DELETE FROM note_labels WHERE note_id = ?"
+INSERT_NOTE_LABEL = "INSERT INTO note_labels (note_id, position, label) VALUES (?, ?, ?)"
+DELETE_NOTE = "DELETE FROM notes WHERE id = ?"
+
+SELECT_LABELS = "SELECT id, name, color FROM labels ORDER BY id"
+UPSERT_LABEL = """
+INSERT INTO labels (id, name, color) VALUES (:id, :name, :color)
+ON CONFLICT (id) DO UPDATE SET name = excluded.name, color = excluded.color
+"""
+DELETE_LABEL = "DELETE FROM labels WHERE id = ?"
+
+SELECT_NEXT_ID = "SELECT next_id FROM sequences WHERE name = ?"
+# Счетчик только растет, даже если процесс с устаревшим значением запишет его позже
+UPSERT_NEXT_ID = """
+INSERT INTO sequences (name, next_id) VALUES (?, ?)
+ON CONFLICT (name) DO UPDATE SET next_id = MAX(next_id, excluded.next_id)
+"""
+
+
+class SqliteDatabase:
+    """Одно соединение с базой notes.db на процесс, общее для заметок и меток"""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(str(db_file)), exist_ok=True)
+        self.is_new = not os.path.exists(db_file)
+        # Транзакциями управляем сами (BEGIN IMMEDIATE), поэтому isolation_level=None
+        self.connection = sqlite3.connect(str(db_file), check_same_thread=False, isolation_level=None, timeout=30)
+        self.lock = threading.RLock()
+        self._depth = 0
+        with self.lock:
+            # WAL: читатели не блокируют писателя, базу могут открывать несколько процессов
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("PRAGMA foreign_keys=ON")
+            self.connection.executescript(SCHEMA)
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """Транзакция на запись; вложенные вызовы входят во внешнюю транзакцию"""
+        with self.lock:
+            if self._depth == 0:
+                # IMMEDIATE сразу берет блокировку записи - другие процессы ждут
+                self.connection.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self.connection
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.connection.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.connection.execute("COMMIT")
+
+    def load_next_id(self, name):
+        rows = self.query(SELECT_NEXT_ID, (name,))
+        return rows[0][0] if rows else 0
+
+    def set_next_id(self, name, next_id):
+        with self.transaction() as connection:
+            connection.execute(UPSERT_NEXT_ID, (name, next_id))
+
+    def data_version(self):
+        """Меняется, когда другое соединение (другой процесс) зафиксировало изменения"""
+        return self.query("PRAGMA data_version")[0][0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class SqliteNoteStorage(NoteStorage):
+    def __init__(self, database):
+        self.db = database
+        self.version = None
+        self.next_id = 0
+
+    def lock(self):
+        return self.db.transaction()
+
+    def has_changed(self):
+        return self.db.data_version() != self.version
+
+    def load(self):
+        self.version = self.db.data_version()
+        self.next_id = self.db.load_next_id('notes')
+        labels = {}
+        for note_id, label in self.db.query(SELECT_NOTE_LABELS):
+            labels.setdefault(note_id, []).append(label)
+        return [
+            {
+                'id': note_id,
+                'title': title,
+                # Сжатый текст лежит в той же колонке как BLOB
+                'content': CompressedText.from_bytes(content) if isinstance(content, bytes) else content,
+                'status': status,
+                'labels': labels.get(note_id, []),
+                'created_at': created_at,
+                'updated_at': updated_at
+            }
+            for note_id, title, content, status, created_at, updated_at in self.db.query(SELECT_NOTES)
+        ]
+
+    def put(self, note):
+        content = compress_text(note['content'])
+        if isinstance(content, CompressedText):
+            note = dict(note, content=content.to_bytes())
+        with self.db.transaction() as connection:
+            connection.execute(UPSERT_NOTE, note)
+            connection.execute(DELETE_NOTE_LABELS, (note['id'],))
+            connection.executemany(
+                INSERT_NOTE_LABEL,
+                [(note['id'], position, label) for position, label in enumerate(note['labels'])]
+            )
+
+    def delete(self, note_id):
+        with self.db.transaction() as connection:
+            connection.execute(DELETE_NOTE, (note_id,))
+
+    def load_next_id(self):
+        return self.next_id
+
+    def set_next_id(self, next_id):
+        self.db.set_next_id('notes', next_id)
+
+    def write_batch(self, puts, deletes, next_id=None):
+        with self.db.transaction():
+            super().write_batch(puts, deletes, next_id)
+
+    def close(self):
+        self.db.close()
+
+
+class SqliteLabelStorage(LabelStorage):
+    def __init__(self, database):
+        self.db = database
+        self.version = None
+        self.next_id = 0
+
+    def lock(self):
+        return self.db.transaction()
+
+    def has_changed(self):
+        return self.db.data_version() != self.version
+
+    def load(self):
+        self.version = self.db.data_version()
+        self.next_id = self.db.load_next_id('labels')
+        rows = self.db.query(SELECT_LABELS)
+        if not rows and self.db.is_new:
+            return None
+        return [{'id': label_id, 'name': name, 'color': color} for label_id, name, color in rows]
+
+    def put(self, label):
+        with self.db.transaction() as connection:
+            connection.execute(UPSERT_LABEL, label)
+
+    def delete(self, label_id):
+        with self.db.transaction() as connection:
+            connection.execute(DELETE_LABEL, (label_id,))
+
+    def load_next_id(self):
+        return self.next_id
+
+    def set_next_id(self, next_id):
+        self.db.set_next_id('labels', next_id)
+
+    def write_batch(self, puts, deletes, next_id=None):
+        with self.db.transaction():
+            super().write_batch(puts, deletes, next_id)
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+# Тесты импортируют модули backend (models, services) напрямую
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.factory import DEFAULT_CONFIG, Services
+
+
+@pytest.fixture
+def app_config():
+    """Настройки приложения для client и asgi_client; тест может переопределить фикстуру"""
+    # Без групповой записи: изменение на диске сразу после ответа
+    return dict(DEFAULT_CONFIG, COMMIT_WINDOW_MS=0)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, app_config):
+    """Тестовый клиент Flask-приложения (app.py) над данными во временной папке"""
+    import app
+
+    services = Services(app_config, tmp_path)
+    monkeypatch.setattr(app, 'services', services)
+    yield app.app.test_client()
+    services.close()
+
+
+@pytest.fixture
+def asgi_client(tmp_path, monkeypatch, app_config):
+    """Тестовый клиент ASGI-приложения (asgi_app.py) над данными во временной папке"""
+    from starlette.testclient import TestClient
+    import asgi_app
+
+    services = Services(app_config, tmp_path, sync_on_read=False)
+    monkeypatch.setattr(asgi_app, 'services', services)
+    yield TestClient(asgi_app.app)
+    services.close()
+
+
+class FlaskResponse:
+    """Ответ Flask с интерфейсом ответа httpx: content и json()"""
+
+    def __init__(self, response):
+        self.response = response
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    @property
+    def content(self):
+        return self.response.data
+
+    def json(self):
+        return self.response.get_json()
+
+
+class FlaskApiClient:
+    """Клиент Flask-приложения с интерфейсом клиента Starlette (params=, content=)"""
+
+    def __init__(self, client, services):
+        self.client = client
+        self.services = services
+
+    def request(self, method, path, params=None, content=None, **kwargs):
+        return FlaskResponse(self.client.open(path, method=method, query_string=params, data=content, **kwargs))
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    @contextmanager
+    def stream(self, path):
+        """Куски тела потокового ответа по мере отдачи; на выходе клиент отключается"""
+        response = self.client.get(path, buffered=False)
+        try:
+            yield iter(response.response)
+        finally:
+            response.close()
+
+
+def get_scope(path):
+    """ASGI scope запроса GET path - для прямого вызова приложения"""
+    return {'type': 'http', 'method': 'GET', 'path': path, 'raw_path': path.encode(),
+            'query_string': b'', 'headers': [], 'http_version': '1.1', 'scheme': 'http',
+            'server': ('testserver', 80), 'client': ('testclient', 50000), 'root_path': ''}
+
+
+class AsgiApiClient:
+    """Клиент ASGI-приложения: тестовый клиент Starlette и stream() для бесконечных ответов"""
+
+    def __init__(self, client, services):
+        self.client = client
+        self.services = services
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    @contextmanager
+    def stream(self, path):
+        """Куски тела потокового ответа по мере отдачи; на выходе клиент отключается.
+
+        Тестовый клиент Starlette дожидается конца ответа, поэтому приложение
+        вызывается напрямую в отдельном потоке со своим циклом событий.
+        """
+        chunks = queue.Queue()
+        disconnected = asyncio.Event()
+        loop = asyncio.new_event_loop()
+
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                chunks.put(message.get('body', b''))
+
+        thread = threading.Thread(target=loop.run_until_complete, args=(self.client.app(get_scope(path), receive, send),))
+        thread.start()
+        try:
+            yield iter(lambda: chunks.get(timeout=5), None)
+        finally:
+            loop.call_soon_threadsafe(disconnected.set)
+            thread.join(5)
+            loop.close()
+
+
+@pytest.fixture(params=['client', 'asgi_client'])
+def api_client(request):
+    """Клиент Flask- или ASGI-приложения: общие тесты маршрутов идут для обоих"""
+    client = request.getfixturevalue(request.param)
+    if request.param == 'client':
+        import app
+        return FlaskApiClient(client, app.services)
+    import asgi_app
+    return AsgiApiClient(client, asgi_app.services)
@@ -0,0 +1,29 @@
+"""Flask-приложение (app.py): то, чего нет в asgi_app.py; общие маршруты - в test_routes.py"""
+import gzip
+
+from flask import Response
+
+import app
+from services import http_compression
+
+
+def test_compress_response(monkeypatch):
+    """Большой JSON сжимается gzip, сильный ETag становится слабым; маленький ответ и 304 - как есть"""
+    monkeypatch.setattr(http_compression, "brotli", None)
+    body = '[' + ','.join('{"title": "note"}' for _ in range(200)) + ']'
+    with app.app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = Response(body, mimetype='application/json')
+        response.set_etag('v1')
+        response = app.compress_response(response)
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert response.get_etag() == ('v1', True)
+        assert gzip.decompress(response.get_data()).decode() == body
+
+        small = app.compress_response(Response('[]', mimetype='application/json'))
+        assert 'Content-Encoding' not in small.headers
+        not_modified = Response(status=304, mimetype='application/json')
+        not_modified.set_etag('v1')
+        not_modified = app.compress_response(not_modified)
+        assert 'Content-Encoding' not in not_modified.headers and not_modified.get_etag() == ('v1', False)
+
@@ -0,0 +1,95 @@
+"""ASGI-приложение (asgi_app.py): то, чего нет в app.py; общие маршруты - в test_routes.py"""
+import asyncio
+import threading
+import time
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import asgi_app
+from conftest import get_scope
+from services import http_compression
+from services.note_service import NoteService
+
+
+def test_changes_of_other_process_are_seen(asgi_client, tmp_path):
+    """Изменение другого процесса перечитывается до запроса, хотя чтения диск не проверяют"""
+    asgi_client.post('/api/notes', json={'title': "своя"})
+    NoteService(str(tmp_path / "notes.json"), compact_interval=0).create_note("чужая", "")
+    assert [n['title'] for n in asgi_client.get('/api/notes').json()] == ["своя", "чужая"]
+
+
+def test_compression_middleware(monkeypatch):
+    """Большой JSON сжимается gzip, сильный ETag становится слабым; маленький ответ и 304 - как есть"""
+    monkeypatch.setattr(http_compression, "brotli", None)
+    body = [{'title': "note"}] * 200
+
+    async def large(request):
+        return JSONResponse(body, headers={'ETag': '"v1"'})
+
+    async def small(request):
+        return JSONResponse([])
+
+    async def not_modified(request):
+        return Response(status_code=304, headers={'ETag': '"v1"'}, media_type='application/json')
+
+    routes = [Route('/large', large), Route('/small', small), Route('/304', not_modified)]
+    test_app = asgi_app.CompressionMiddleware(Starlette(routes=routes))
+    with TestClient(test_app) as client:
+        response = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['content-encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['vary']
+        assert response.headers['etag'] == 'W/"v1"'
+        assert response.json() == body
+
+        assert 'content-encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+        identity = client.get('/large', headers={'Accept-Encoding': 'identity'})
+        assert 'content-encoding' not in identity.headers and identity.headers['etag'] == '"v1"'
+        cached = client.get('/304', headers={'Accept-Encoding': 'gzip'})
+        assert 'content-encoding' not in cached.headers and cached.headers['etag'] == '"v1"'
+
+
+def test_reads_do_not_block_event_loop(asgi_client):
+    """Чтение, которое ждет блокировку сервиса (ее держит изменение), ждет в пуле потоков, а не в цикле событий"""
+    asgi_client.post('/api/notes', json={'title': "первая"})
+    workspace = asgi_app.services.acquire(None)
+    asgi_app.services.release(workspace)
+    held = threading.Event()
+
+    def hold_write_lock():
+        with workspace.notes.lock.write():
+            held.set()
+            time.sleep(1)
+
+    async def call(path):
+        sent = []
+        requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def send(message):
+            sent.append(message)
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            # Клиент не отключается, пока его не отменят
+            await asyncio.Event().wait()
+
+        await asgi_app.app(get_scope(path), receive, send)
+        return sent[0]['status'], b''.join(message.get('body', b'') for message in sent[1:])
+
+    async def scenario():
+        holder = threading.Thread(target=hold_write_lock)
+        holder.start()
+        held.wait()
+        notes = asyncio.create_task(call('/api/notes'))
+        await asyncio.sleep(0.05)
+        assert await call('/api/health') == (200, b'{"status":"ok"}')
+        # Цикл событий ответил, пока блокировка еще занята
+        assert holder.is_alive()
+        status, body = await notes
+        holder.join()
+        assert status == 200 and "первая".encode() in body
+
+    asyncio.run(scenario())
@@ -0,0 +1,44 @@
+from services.event_bus import EventBus
+
+
+def test_publish_to_subscribers():
+    """Каждый подписчик получает события по порядку"""
+    bus = EventBus()
+    with bus.subscribe() as first, bus.subscribe() as second:
+        bus.publish('note_created', {'id': 1})
+        bus.publish('note_deleted', {'id': 1})
+        for subscription in (first, second):
+            assert subscription.get(timeout=0) == ('note_created', {'id': 1})
+            assert subscription.get(timeout=0) == ('note_deleted', {'id': 1})
+            assert subscription.get(timeout=0) is None
+    assert not bus.subscribers
+
+
+def test_slow_subscriber_is_dropped():
+    """Переполнивший очередь подписчик получает resync и отключается, остальные - нет"""
+    bus = EventBus(max_queue=2)
+    slow = bus.subscribe()
+    for i in range(3):
+        bus.publish('note_updated', {'id': i})
+    assert slow.get(timeout=0) == ('resync', {})
+    assert slow.closed()
+    assert slow not in bus.subscribers
+
+    fast = bus.subscribe()
+    bus.publish('note_updated', {'id': 4})
+    assert fast.get(timeout=0) == ('note_updated', {'id': 4})
+
+
+def test_async_subscription():
+    """Асинхронный подписчик получает событие, опубликованное из другого потока"""
+    import asyncio
+    import threading
+
+    async def main():
+        bus = EventBus()
+        with bus.subscribe(loop=asyncio.get_running_loop()) as subscription:
+            assert await subscription.get_async(timeout=0.01) is None
+            threading.Timer(0.01, bus.publish, ('note_created', {'id': 1})).start()
+            return await subscription.get_async(timeout=5)
+
+    assert asyncio.run(main()) == ('note_created', {'id': 1})
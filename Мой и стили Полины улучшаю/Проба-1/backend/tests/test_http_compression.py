@@ -0,0 +1,33 @@
+import gzip
+from services import http_compression
+from services.http_compression import choose_encoding, compress, compress_chunks
+
+
+def test_choose_encoding_without_brotli(monkeypatch):
+    """Без пакета brotli выбирается gzip, если клиент его принимает"""
+    monkeypatch.setattr(http_compression, "brotli", None)
+    assert choose_encoding(None) is None
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("br") is None
+    assert choose_encoding("br, gzip;q=0.5") == "gzip"
+
+
+def test_choose_encoding_weights(monkeypatch):
+    """q=0 запрещает сжатие, * подходит для любого, при равных весах br лучше gzip"""
+    monkeypatch.setattr(http_compression, "brotli", object())
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("gzip;q=1.0, br;q=0.5") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("br;q=0, gzip;q=0") is None
+    assert choose_encoding("*") == "br"
+    assert choose_encoding("*;q=0.1, br;q=0") == "gzip"
+    assert choose_encoding("*;q=0") is None
+    assert choose_encoding("GZIP;q=bad, deflate") is None
+
+
+def test_gzip_round_trip():
+    """Сжатый целиком и по кускам ответ распаковывается в исходные байты"""
+    data = b'{"title": "note"}' * 200
+    assert gzip.decompress(compress("gzip", data)) == data
+    chunks = list(compress_chunks("gzip", [data[:100], data[100:]]))
+    assert gzip.decompress(b''.join(chunks)) == data
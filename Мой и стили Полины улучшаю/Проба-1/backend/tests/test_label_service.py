@@ -0,0 +1,33 @@
+from services.label_service import LabelService
+
+
+def make_service(tmp_path):
+    return LabelService(str(tmp_path / "labels.json"))
+
+
+def test_find_label_by_id_and_name(tmp_path):
+    """Метки ищутся по id и по имени без учета регистра, индексы следят за удалением"""
+    service = make_service(tmp_path)
+    label = service.create_label("Проект Ёлка")
+    assert service.create_label("проект ёлка")['id'] == label['id']
+    assert service.get_label(label['id']) == label
+    assert service.find_by_name(" ПРОЕКТ ЁЛКА ") == label
+
+    assert service.delete_label(label['id'])
+    assert service.get_label(label['id']) is None
+    assert service.find_by_name("проект ёлка") is None
+    assert not service.delete_label(label['id'])
+
+
+def test_existing_labels_are_not_written(tmp_path, monkeypatch):
+    """Пакет, который только повторяет существующие метки, не пишет на диск"""
+    service = make_service(tmp_path)
+    generation = service.get_generation()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("unexpected write")
+
+    monkeypatch.setattr(service.storage, 'write_batch', fail)
+    results = service.apply_batch([{'op': 'create', 'name': " Работа "}, {'op': 'create', 'name': "ИДЕИ"}])
+    assert [(r['label']['id'], r['created']) for r in results] == [(1, False), (4, False)]
+    assert service.get_generation() == generation
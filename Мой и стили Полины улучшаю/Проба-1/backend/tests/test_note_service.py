@@ -0,0 +1,442 @@
+import json
+from services.event_bus import EventBus
+from services.note_service import NoteService
+from services.response_cache import ENTRY_OVERHEAD, ResponseCache
+
+
+def make_service(tmp_path):
+    return NoteService(str(tmp_path / "notes.json"), compact_interval=0)
+
+
+def test_journal_replay(tmp_path):
+    """Изменения из notes.wal восстанавливаются при запуске"""
+    service = make_service(tmp_path)
+    service.create_note("первая", "текст", ["работа"])
+    service.create_note("вторая", "")
+    service.update_note(1, title="Первая")
+    service.delete_note(2)
+
+    restored = make_service(tmp_path)
+    notes = restored.get_notes()
+    assert [n['id'] for n in notes] == [1]
+    assert notes[0]['title'] == "Первая"
+
+
+def test_journal_compaction(tmp_path):
+    """После сжатия журнал пуст, а данные лежат в notes.json"""
+    service = make_service(tmp_path)
+    service.create_note("заметка", "текст")
+    service.compact()
+
+    assert (tmp_path / "notes.wal").read_text(encoding='utf-8') == ''
+    assert make_service(tmp_path).get_notes()[0]['title'] == "заметка"
+
+
+def test_journal_torn_record(tmp_path):
+    """Оборванная запись в конце журнала (сбой посреди дозаписи) не съедает записи после нее"""
+    service = make_service(tmp_path)
+    service.create_note("a", "")
+    service.close()
+    with open(tmp_path / "notes.wal", 'a', encoding='utf-8') as f:
+        f.write('{"op":"put","note":{"id":9')
+
+    service = make_service(tmp_path)
+    service.create_note("b", "")
+    service.close()
+
+    restored = make_service(tmp_path)
+    assert [n['title'] for n in restored.get_notes()] == ["a", "b"]
+    assert restored.create_note("c", "")['id'] == 3
+
+
+def test_get_note_by_id(tmp_path):
+    """Заметка находится по id, удаленная - нет"""
+    service = make_service(tmp_path)
+    service.create_note("первая", "")
+    service.create_note("вторая", "")
+    service.delete_note(1)
+
+    assert service.get_note(1) is None
+    assert service.get_note(2)['title'] == "вторая"
+    assert [n['id'] for n in service.get_notes()] == [2]
+
+
+def test_filters_follow_updates(tmp_path):
+    """Фильтры по статусу и метке учитывают изменения заметок"""
+    service = make_service(tmp_path)
+    service.create_note("первая", "", ["работа"])
+    service.create_note("вторая", "", ["работа", "срочно"])
+    service.create_note("третья", "", ["срочно"])
+    service.update_note(2, status="completed")
+    service.remove_label_from_all_notes("срочно")
+
+    assert [n['id'] for n in service.get_notes(label_filter="работа")] == [1, 2]
+    assert [n['id'] for n in service.get_notes(status_filter="active", label_filter="работа")] == [1]
+    assert service.get_notes(label_filter="срочно") == []
+    assert service.get_note(3)['labels'] == []
+
+
+def test_notes_page(tmp_path):
+    """Постраничная выдача по курсору без повторов и пропусков"""
+    service = make_service(tmp_path)
+    for i in range(5):
+        service.create_note(f"заметка {i}", "текст")
+    service.update_note(1, title="свежая")
+
+    page = service.get_notes_page(limit=2, fields=['id', 'title'])
+    assert [n['id'] for n in page['notes']] == [1, 5]
+    assert page['notes'][0] == {'id': 1, 'title': "свежая"}
+
+    seen = [n['id'] for n in page['notes']]
+    while page['next_cursor']:
+        page = service.get_notes_page(limit=2, cursor=page['next_cursor'])
+        seen += [n['id'] for n in page['notes']]
+    assert seen == [1, 5, 4, 3, 2]
+
+
+def test_filtered_pages_reuse_sorted_keys(tmp_path):
+    """Ключи страниц под фильтром сортируются один раз и пересобираются после изменения"""
+    service = make_service(tmp_path)
+    for i in range(5):
+        service.create_note(f"заметка {i}", "", ["работа"] if i % 2 == 0 else [])
+
+    page = service.get_notes_page(label_filter="работа", limit=2)
+    keys = service.page_keys[(None, "работа")]
+    page = service.get_notes_page(label_filter="работа", limit=2, cursor=page['next_cursor'])
+    assert service.page_keys[(None, "работа")] is keys
+    assert [n['id'] for n in page['notes']] == [1]
+
+    service.update_note(1, title="свежая")
+    assert service.page_keys == {}
+    assert [n['id'] for n in service.get_notes_page(label_filter="работа")['notes']] == [1, 5, 3]
+
+
+def test_search_notes(tmp_path):
+    """Поиск по словам и префиксам без учета регистра"""
+    service = make_service(tmp_path)
+    service.create_note("Отчёт по работе", "квартальный отчет")
+    service.create_note("Покупки", "молоко, хлеб")
+    service.create_note("Идеи", "рабочие заметки")
+
+    assert [n['id'] for n in service.search_notes("ОТЧЕТ")] == [1]
+    assert sorted(n['id'] for n in service.search_notes("раб*")) == [1, 3]
+
+    service.update_note(2, content="отчет о покупках")
+    service.delete_note(1)
+    assert [n['id'] for n in service.search_notes("отчет")] == [2]
+
+
+def test_prefix_search_keeps_frequent_terms(tmp_path):
+    """Если слов с префиксом больше предела, остаются самые частые, а не первые по алфавиту"""
+    service = make_service(tmp_path)
+    for i in range(60):
+        service.create_note(f"код раб{i:02d}", "")
+    service.create_note("план", "работа")
+    service.create_note("отчет", "работа")
+
+    found = [n['title'] for n in service.search_notes("раб*", limit=100)]
+    assert "план" in found and "отчет" in found
+
+
+def test_apply_batch(tmp_path):
+    """Пакет операций выполняется целиком, ошибки - по каждой операции"""
+    service = make_service(tmp_path)
+    results = service.apply_batch([
+        {'op': 'create', 'title': "первая"},
+        {'op': 'create', 'title': "вторая", 'labels': ["работа"]},
+        {'op': 'update', 'id': 1, 'status': "completed"},
+        {'op': 'delete', 'id': 2},
+        {'op': 'delete', 'id': 42},
+        {'op': 'create'},
+    ])
+
+    assert [r['ok'] for r in results] == [True, True, True, True, False, False]
+    assert results[2]['note']['status'] == "completed"
+    notes = make_service(tmp_path).get_notes()
+    assert [(n['id'], n['status']) for n in notes] == [(1, "completed")]
+
+
+def test_apply_batch_validates_fields(tmp_path):
+    """Поля операций проверяются так же, как при импорте: неверная операция ничего не меняет"""
+    service = make_service(tmp_path)
+    service.create_note("первая", "текст")
+    results = service.apply_batch([
+        {'op': 'update', 'id': 1, 'status': "bogus"},
+        {'op': 'update', 'id': 1, 'labels': "abc"},
+        {'op': 'update', 'id': 1, 'labels': [1, 2]},
+        {'op': 'update', 'id': 1, 'content': None},
+        {'op': 'create', 'title': "  "},
+        {'op': 'update', 'id': 1, 'labels': ["работа"]},
+    ])
+
+    assert [r['ok'] for r in results] == [False, False, False, False, False, True]
+    note = service.get_note(1)
+    assert (note['status'], note['content'], note['labels']) == ("active", "текст", ["работа"])
+
+
+def test_export_import(tmp_path):
+    """Выгруженные заметки загружаются обратно, неверные записи отклоняются"""
+    import pytest
+    from models.note import Note
+
+    source = make_service(tmp_path / "source")
+    source.create_note("первая", "текст", ["работа"])
+    source.create_note("вторая", "")
+
+    target = make_service(tmp_path / "target")
+    target.create_note("своя", "")
+    assert target.import_notes([Note.from_dict(n) for n in source.export_notes()]) == 2
+    assert [(n['id'], n['title']) for n in target.get_notes()] == [(1, "своя"), (2, "первая"), (3, "вторая")]
+    # Заметка со своим id заменяет существующую и остается на своем месте в списке
+    assert target.import_notes([Note.from_dict({'id': 2, 'title': "замена"})], keep_ids=True) == 1
+    assert [n['title'] for n in target.get_notes()] == ["своя", "замена", "вторая"]
+
+    with pytest.raises(ValueError):
+        Note.from_dict({'title': "x", 'status': "unknown"})
+
+
+def test_api_import_chunks(tmp_path, monkeypatch):
+    """Импорт NDJSON из services.api: пачки по IMPORT_CHUNK_SIZE, номера строк в ошибках"""
+    from services import api
+
+    monkeypatch.setattr(api, 'IMPORT_CHUNK_SIZE', 2)
+    service = make_service(tmp_path)
+    importer = api.NoteImport(service)
+    lines = [b'{"title": "1"}', b'', b'not json', b'{"title": "2"}', b'{"title": "3"}']
+    chunks = [chunk for chunk in map(importer.add_line, lines) if chunk]
+    assert [[note.title for note in chunk] for chunk in chunks] == [["1", "2"]]
+    for chunk in chunks + [importer.finish()]:
+        importer.save(chunk)
+    result = importer.result()
+    assert (result['imported'], result['failed']) == (3, 1)
+    assert result['errors'][0]['line'] == 3
+    assert [n['title'] for n in service.get_notes()] == ["1", "2", "3"]
+    assert ''.join(api.export_ndjson(service)).count('\n') == 3
+
+
+def test_notes_json_cache(tmp_path):
+    """Список в JSON совпадает с get_notes и обновляется после изменения заметки"""
+
+    service = make_service(tmp_path)
+    service.create_note("первая", "текст", ["работа"])
+    service.create_note("вторая", "")
+    assert json.loads(service.get_notes_json()) == service.get_notes()
+
+    service.update_note(1, title="новая")
+    assert json.loads(service.get_notes_json(label_filter="работа"))[0]['title'] == "новая"
+
+
+def test_iter_json_list():
+    """Потоковый массив собирается в тот же JSON при любом размере куска"""
+    from services.json_encoder import iter_json_list
+
+    items = [{'id': i, 'title': "заметка"} for i in range(5)]
+    for chunk_size in (1, 2, 5, 10):
+        assert json.loads(''.join(iter_json_list(items, chunk_size=chunk_size))) == items
+    assert ''.join(iter_json_list([])) == '[]'
+
+
+def test_services_do_not_need_flask():
+    """Модели и сервисы импортируются и без Flask - ими пользуется и asgi_app"""
+    import os
+    import subprocess
+    import sys
+
+    code = "import sys; sys.modules['flask'] = None; import models.note, models.label, services.factory"
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', code], cwd=backend_dir, check=True)
+
+
+def test_generation(tmp_path):
+    """Поколение растет при изменениях и не меняется при чтении"""
+    service = make_service(tmp_path)
+    generation, _ = service.get_generation()
+    service.get_notes()
+    assert service.get_generation()[0] == generation
+
+    note = service.create_note("первая", "")
+    service.update_note(note['id'], title="новая")
+    service.delete_note(note['id'])
+    assert service.get_generation()[0] == generation + 3
+
+
+def test_changes_since_revision(tmp_path):
+    """Изменения после ревизии: текущие версии заметок и id удаленных"""
+    import pytest
+    from services import note_service as note_service_module
+
+    service = make_service(tmp_path)
+    first = service.create_note("первая", "")
+    second = service.create_note("вторая", "")
+    revision = service.get_revision()
+
+    service.update_note(first['id'], title="новая")
+    third = service.create_note("третья", "")
+    service.delete_note(second['id'])
+    changes = service.get_changes(revision)
+    assert [n['title'] for n in changes['notes']] == ["новая", "третья"]
+    assert changes['deleted'] == [second['id']]
+    assert service.get_changes(changes['revision']) == {'revision': changes['revision'], 'notes': [], 'deleted': []}
+
+    # Ревизия чужого процесса или вытесненная из журнала - нужна полная загрузка
+    assert service.get_changes('other.1') is None
+    service.change_log = note_service_module.deque(service.change_log, maxlen=2)
+    service.update_note(third['id'], title="x")
+    service.update_note(third['id'], title="y")
+    assert service.get_changes(revision) is None
+    with pytest.raises(ValueError):
+        service.get_changes('abc.x')
+
+
+def test_publish_events(tmp_path):
+    """Сервис сообщает об изменениях заметок подписчикам"""
+    bus = EventBus()
+    service = NoteService(str(tmp_path / "notes.json"), compact_interval=0, events=bus)
+    with bus.subscribe() as subscription:
+        note = service.create_note("первая", "", ["работа"])
+        service.remove_label_from_all_notes("работа")
+        service.delete_note(note['id'])
+        service.delete_note(note['id'])
+        events = []
+        while (event := subscription.get(timeout=0)) is not None:
+            events.append(event[0])
+    assert events == ['note_created', 'label_removed', 'note_deleted']
+
+
+def test_concurrent_creates(tmp_path):
+    """Параллельные создания и чтения из потоков: id не повторяются и после удаления"""
+    import threading
+
+    service = make_service(tmp_path)
+    errors = []
+
+    def worker():
+        try:
+            for i in range(50):
+                service.create_note(f"заметка {i}", "")
+                service.get_notes(status_filter="active")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    ids = [note['id'] for note in service.get_notes()]
+    assert sorted(ids) == list(range(1, 401))
+    service.delete_note(400)
+    assert service.create_note("новая", "")['id'] == 401
+
+
+def test_remove_label_touches_only_labeled_notes(tmp_path):
+    """Удаление метки меняет только заметки с ней, всем ставится одно время, счетчики берутся из индекса"""
+    service = make_service(tmp_path)
+    service.create_note("первая", "", ["работа", "срочно"])
+    untouched = service.create_note("вторая", "", ["личное"])
+    service.create_note("третья", "", ["работа"])
+    assert service.get_label_counts() == {"работа": 2, "срочно": 1, "личное": 1}
+
+    service.remove_label_from_all_notes("работа")
+    notes = service.get_notes()
+    assert [n['labels'] for n in notes] == [["срочно"], ["личное"], []]
+    assert notes[0]['updated_at'] == notes[2]['updated_at']
+    assert notes[1] == untouched
+    assert make_service(tmp_path).get_notes() == notes
+    assert service.get_label_counts() == {"срочно": 1, "личное": 1}
+
+
+def test_response_cache_invalidation(tmp_path):
+    """Кэш списков сбрасывается только для фильтров, которых касается изменение"""
+    cache = ResponseCache(max_bytes=1024 * 1024)
+    service = NoteService(str(tmp_path / "notes.json"), compact_interval=0, response_cache=cache)
+    service.create_note("первая", "", ["работа"])
+    service.create_note("вторая", "", ["личное"])
+    service.get_notes_json(status_filter="active")
+    service.get_notes_json(status_filter="completed")
+    for label in ("работа", "личное"):
+        service.get_notes_json(label_filter=label)
+    service.get_notes_json(label_filter="работа")
+    assert (cache.hits, cache.misses) == (1, 4)
+    assert ("active", None) in cache.entries and ("completed", None) in cache.entries
+
+    service.update_note(2, title="изменена")
+    assert ("active", None) not in cache.entries and (None, "личное") not in cache.entries
+    assert ("completed", None) in cache.entries and (None, "работа") in cache.entries
+    assert json.loads(service.get_notes_json(label_filter="работа"))[0]['title'] == "первая"
+    assert json.loads(service.get_notes_json(label_filter="личное"))[0]['title'] == "изменена"
+    assert cache.stats()['hits'] == 2
+
+
+def test_response_cache_size_limit():
+    """Старые записи вытесняются, когда кэш превышает лимит; в размер входят ключ и накладные расходы записи"""
+    entry = ENTRY_OVERHEAD + 1  # ключ в один символ
+    cache = ResponseCache(max_bytes=2 * entry + 10)
+    cache.put('a', b'12345')
+    cache.put('b', b'12345')
+    cache.get('a')
+    cache.put('c', b'123')
+    # Запись больше лимита не кладется совсем
+    cache.put('d', b'x' * (2 * entry))
+    assert list(cache.entries) == ['a', 'c'] and cache.size == 2 * entry + 8 and cache.evictions == 1
+
+
+def test_response_cache_bounds_empty_entries(tmp_path):
+    """Пустые списки по несуществующим меткам тоже расходуют лимит - кэш не растет без предела"""
+    cache = ResponseCache(max_bytes=64 * 1024)
+    service = NoteService(str(tmp_path / "notes.json"), compact_interval=0, response_cache=cache)
+    for i in range(2000):
+        assert service.get_notes_json(label_filter=f"метка-{i}") == '[]'
+    assert cache.size <= cache.max_bytes and cache.evictions > 0
+    assert len(cache.entries) < cache.max_bytes // ENTRY_OVERHEAD
+
+
+def test_response_cache_namespace_stats():
+    """У каждого пространства имен свои счетчики; выгруженное пространство уносит записи и счетчики"""
+    cache = ResponseCache(max_bytes=1024 * 1024)
+    acme, beta = cache.namespace("acme"), cache.namespace("beta")
+    acme.put(("active", None), b'[]')
+    acme.get(("active", None))
+    beta.get(("active", None))
+    assert [acme.stats()[key] for key in ('entries', 'hits', 'misses')] == [1, 1, 0]
+    assert [beta.stats()[key] for key in ('entries', 'hits', 'misses')] == [0, 0, 1]
+    assert cache.stats()['entries'] == 1
+
+    acme.close()
+    assert cache.stats()['entries'] == 0 and cache.size == 0
+    assert acme.stats()['hits'] == 0 and beta.stats()['misses'] == 1
+
+
+def test_archived_notes_live_in_cold_store(tmp_path):
+    """Архивные заметки уходят из памяти во временный файл, но выдаются как раньше"""
+    service = make_service(tmp_path)
+    service.create_note("первая", "про отпуск", ["личное"])
+    service.create_note("вторая", "", ["личное"])
+    service.update_note(1, status="archived")
+    assert list(service.notes) == [2] and 1 in service.archive
+
+    assert [n['id'] for n in service.get_notes()] == [1, 2]
+    assert [n['id'] for n in service.get_notes(label_filter="личное")] == [1, 2]
+    assert [n['id'] for n in json.loads(service.get_notes_json())] == [1, 2]
+    assert [n['id'] for n in service.get_notes_page()['notes']] == [1, 2]
+    assert [n['title'] for n in service.get_notes(status_filter="archived")] == ["первая"]
+    assert service.get_note(1)['content'] == "про отпуск"
+    assert [n['id'] for n in service.search_notes("отпуск")] == [1]
+    assert service.get_label_counts() == {"личное": 2}
+
+    service.remove_label_from_all_notes("личное")
+    assert service.get_note(1)['labels'] == []
+    restored = make_service(tmp_path)
+    assert 1 in restored.archive and restored.get_note(1)['labels'] == []
+    assert len(list(restored.export_notes())) == 2
+
+    assert [n['id'] for n in restored.search_notes("отпуск")] == [1]
+    restored.update_note(1, status="active")
+    # Вернувшаяся из архива заметка дописана в конец словаря, но список идет по id
+    assert list(restored.notes) == [2, 1] and not restored.archive
+    assert [n['id'] for n in restored.get_notes()] == [1, 2]
+    assert [n['id'] for n in json.loads(restored.get_notes_json())] == [1, 2]
+    restored.delete_note(1)
+    assert restored.get_note(1) is None and 1 not in restored.archive
@@ -0,0 +1,199 @@
+"""Маршруты API, общие для app.py и asgi_app.py: каждый тест идет для обоих приложений"""
+import gzip
+import json
+
+import pytest
+
+from services import http_compression
+from services.factory import DEFAULT_CONFIG
+
+
+def test_conditional_notes_list(api_client):
+    """Список заметок отдает ETag и Last-Modified; актуальная копия клиента - 304 без тела"""
+    api_client.post('/api/notes', json={'title': "первая"})
+    response = api_client.get('/api/notes')
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and response.headers['Cache-Control'] == 'no-cache'
+    assert response.headers['Last-Modified']
+
+    cached = api_client.get('/api/notes', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.content == b'' and cached.headers['ETag'] == etag
+    assert etag.startswith('W/')
+    assert api_client.get('/api/notes', headers={'If-None-Match': etag[2:]}).status_code == 304
+    since = api_client.get('/api/notes', headers={'If-Modified-Since': response.headers['Last-Modified']})
+    assert since.status_code == 304
+
+    # Другие фильтры - другой ETag; изменение заметок меняет ETag
+    assert api_client.get('/api/notes?status=active').headers['ETag'] != etag
+    api_client.put('/api/notes/1', json={'status': "completed"})
+    changed = api_client.get('/api/notes', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert changed.json()[0]['status'] == "completed"
+
+
+def test_conditional_labels_follow_notes(api_client):
+    """ETag списка меток меняется и от меток, и от заметок (в нем счетчики заметок)"""
+    etag = api_client.get('/api/labels').headers['ETag']
+    assert api_client.get('/api/labels', headers={'If-None-Match': etag}).status_code == 304
+    api_client.post('/api/notes', json={'title': "первая", 'labels': ["работа"]})
+    assert api_client.get('/api/labels', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_compressed_list_revalidates(api_client, monkeypatch):
+    """ETag сжатого списка подходит для If-None-Match: 304 отдает тот же ETag"""
+    monkeypatch.setattr(http_compression, "brotli", None)
+    for i in range(50):
+        api_client.post('/api/notes', json={'title': f"заметка {i}", 'content': "текст " * 20})
+    response = api_client.get('/api/notes', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    # Клиент Starlette распаковывает тело сам, Flask отдает как есть
+    body = response.content
+    if body[:2] == b'\x1f\x8b':
+        body = gzip.decompress(body)
+    assert len(json.loads(body)) == 50
+    cached = api_client.get('/api/notes', headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304 and cached.headers['ETag'] == response.headers['ETag']
+
+
+def test_notes_crud_and_validation(api_client):
+    """Создание, чтение, изменение и удаление заметки; неверные поля - 400"""
+    created = api_client.post('/api/notes', json={'title': "первая", 'content': "про отпуск", 'labels': ["работа"]})
+    assert created.status_code == 201 and created.json()['id'] == 1
+    assert api_client.get('/api/notes/1').json()['content'] == "про отпуск"
+    assert api_client.get('/api/notes/2').status_code == 404
+
+    for body in ({'status': "bogus"}, {'labels': "abc"}, {'labels': [1, 2]}, {'content': None}):
+        assert api_client.put('/api/notes/1', json=body).status_code == 400
+    assert api_client.post('/api/notes', json={'content': "без заголовка"}).status_code == 400
+    broken = api_client.post('/api/notes', content=b'not json', headers={'Content-Type': 'application/json'})
+    assert broken.status_code == 400
+
+    updated = api_client.put('/api/notes/1', json={'status': "completed"})
+    assert updated.json()['status'] == "completed" and updated.json()['content'] == "про отпуск"
+    assert api_client.put('/api/notes/7', json={'title': "нет такой"}).status_code == 404
+    assert [n['id'] for n in api_client.get('/api/notes/search?q=отпуск').json()] == [1]
+
+    assert api_client.delete('/api/notes/1').status_code == 204
+    assert api_client.get('/api/notes/1').status_code == 404
+
+
+def test_batch_export_and_import(api_client):
+    """Пакет операций, выгрузка NDJSON и загрузка ее обратно"""
+    results = api_client.post('/api/notes:batch', json=[
+        {'op': 'create', 'title': "первая"},
+        {'op': 'create', 'title': "вторая"},
+        {'op': 'update', 'id': 1, 'status': "bogus"},
+    ]).json()['results']
+    assert [r['ok'] for r in results] == [True, True, False]
+    assert api_client.post('/api/notes:batch', json={'operations': "abc"}).status_code == 400
+
+    exported = api_client.get('/api/export')
+    assert exported.headers['Content-Type'] == 'application/x-ndjson'
+    assert len(exported.content.splitlines()) == 2
+
+    imported = api_client.post('/api/import', content=exported.content + b'not json\n').json()
+    assert (imported['imported'], imported['failed']) == (2, 1)
+    assert imported['errors'][0]['line'] == 3
+    assert [n['id'] for n in api_client.get('/api/notes').json()] == [1, 2, 3, 4]
+
+
+def test_changes_and_labels(api_client):
+    """Изменения с ревизии, удаление метки вместе с ней из заметок"""
+    api_client.post('/api/notes', json={'title': "первая", 'labels': ["работа"]})
+    revision = api_client.get('/api/notes').headers['X-Revision']
+    api_client.put('/api/notes/1', json={'title': "новая"})
+    changes = api_client.get('/api/notes/changes', params={'since': revision}).json()
+    assert [n['title'] for n in changes['notes']] == ["новая"]
+    assert api_client.get('/api/notes/changes', params={'since': 'other.1'}).status_code == 410
+    assert api_client.get('/api/notes/changes').status_code == 400
+
+    labels = api_client.get('/api/labels', params={'with_counts': '1'}).json()
+    label_id, count = next((label['id'], label['count']) for label in labels if label['name'] == "работа")
+    assert count == 1
+    assert api_client.delete(f'/api/labels/{label_id}').status_code == 204
+    assert api_client.get('/api/notes/1').json()['labels'] == []
+    assert api_client.delete(f'/api/labels/{label_id}').status_code == 404
+
+
+def test_labels_batch(api_client):
+    """Пакет операций с метками; удаленная метка пропадает и из заметок"""
+    api_client.post('/api/notes', json={'title': "первая", 'labels': ["идеи"]})
+    results = api_client.post('/api/labels:batch', json=[
+        {'op': 'create', 'name': "отпуск"},
+        {'op': 'delete', 'id': 4},
+        {'op': 'delete', 'id': 99},
+    ]).json()['results']
+    assert [r['ok'] for r in results] == [True, True, False]
+    assert api_client.get('/api/notes/1').json()['labels'] == []
+
+
+def test_create_existing_label(api_client):
+    """Метка с уже занятым именем отдается как есть с кодом 200, новая - с кодом 201"""
+    existing = api_client.post('/api/labels', json={'name': " РАБОТА "})
+    assert existing.status_code == 200 and existing.json()['id'] == 1
+    created = api_client.post('/api/labels', json={'name': "отпуск"})
+    assert created.status_code == 201 and created.json()['name'] == "отпуск"
+    assert api_client.post('/api/labels', json={'name': 5}).status_code == 400
+
+
+def test_cache_stats(api_client):
+    """Повторный запрос списка отдается из кэша ответов, изменение заметки сбрасывает его"""
+    api_client.post('/api/notes', json={'title': "первая"})
+    first = api_client.get('/api/notes?status=active').content
+    assert api_client.get('/api/notes?status=active').content == first
+    stats = api_client.get('/api/cache/stats').json()
+    assert (stats['entries'], stats['hits'], stats['misses']) == (1, 1, 1)
+
+    api_client.put('/api/notes/1', json={'title': "новая"})
+    assert api_client.get('/api/notes?status=active').json()[0]['title'] == "новая"
+    stats = api_client.get('/api/cache/stats').json()
+    assert (stats['hits'], stats['misses'], stats['invalidations']) == (1, 2, 1)
+
+
+def test_cache_stats_are_per_workspace(api_client):
+    """/api/cache/stats пространства считает только его записи"""
+    api_client.get('/api/w/acme/notes?status=active')
+    assert api_client.get('/api/w/acme/cache/stats').json()['entries'] == 1
+    assert api_client.get('/api/cache/stats').json()['entries'] == 0
+
+
+@pytest.mark.parametrize('app_config', [dict(DEFAULT_CONFIG, COMMIT_WINDOW_MS=0, RESPONSE_CACHE_BYTES=0)])
+def test_cache_stats_without_cache(app_config, api_client):
+    response = api_client.get('/api/cache/stats')
+    assert response.status_code == 404 and response.json() == {'error': 'Response cache is disabled'}
+
+
+def test_workspace_routing(api_client):
+    """Пространство выбирается заголовком X-Workspace-Id или префиксом /api/w/<id>; без них - общие данные"""
+    api_client.post('/api/notes', json={'title': "общая"})
+    api_client.post('/api/notes', json={'title': "для acme"}, headers={'X-Workspace-Id': "acme"})
+    api_client.post('/api/w/beta/notes', json={'title': "для beta"})
+
+    def titles(path, **kwargs):
+        return [n['title'] for n in api_client.get(path, **kwargs).json()]
+
+    assert titles('/api/notes') == ["общая"]
+    assert titles('/api/w/acme/notes') == ["для acme"]
+    assert titles('/api/notes', headers={'X-Workspace-Id': "beta"}) == ["для beta"]
+    assert api_client.get('/api/w/acme/notes/1').json()['title'] == "для acme"
+
+    invalid = api_client.get('/api/notes', headers={'X-Workspace-Id': "../acme"})
+    assert invalid.status_code == 400 and 'error' in invalid.json()
+    assert api_client.get('/api/w/a.b/notes').status_code == 400
+
+
+@pytest.mark.parametrize('app_config', [dict(DEFAULT_CONFIG, COMMIT_WINDOW_MS=0, WORKSPACES_MAX_LOADED=1)])
+def test_events_subscriber_keeps_workspace_loaded(app_config, api_client):
+    """Пространство с подписчиком /api/events не выгружается, после отключения клиента - выгружается"""
+    with api_client.stream('/api/w/acme/events') as events:
+        assert next(events) == b'retry: 3000\n\n'
+        api_client.post('/api/w/acme/notes', json={'title': "для acme"})
+        event = next(events)
+        assert event.startswith(b'event: note_created')
+        assert json.loads(event.split(b'data: ')[1])['title'] == "для acme"
+
+        api_client.get('/api/w/beta/notes')
+        assert list(api_client.services.loaded) == ["acme"]
+    api_client.get('/api/w/beta/notes')
+    assert list(api_client.services.loaded) == ["beta"]
+
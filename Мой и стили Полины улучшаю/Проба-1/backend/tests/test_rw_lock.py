@@ -0,0 +1,41 @@
+import threading
+import time
+from services.rw_lock import RWLock
+
+
+def test_readers_share_writer_excludes():
+    """Читатели работают одновременно, писатель ждет, пока они закончат"""
+    lock = RWLock()
+    events = []
+
+    def read():
+        with lock.read():
+            events.append('read')
+
+    def write():
+        with lock.write():
+            events.append('write')
+
+    with lock.read():
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join(timeout=1)
+        assert events == ['read']
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        time.sleep(0.05)
+        assert events == ['read']
+    writer.join(timeout=1)
+    assert events == ['read', 'write']
+
+
+def test_writer_is_reentrant():
+    """Поток-писатель может снова взять запись и чтение"""
+    lock = RWLock()
+    with lock.write():
+        with lock.write():
+            with lock.read():
+                pass
+    with lock.read():
+        pass
@@ -0,0 +1,259 @@
+import threading
+from services.label_service import LabelService
+from services.note_service import NoteService
+from storage.group_commit import GroupCommitNoteStorage
+from storage.json_storage import JsonNoteStorage
+from storage.sqlite_storage import SqliteDatabase, SqliteNoteStorage, SqliteLabelStorage
+
+
+def test_sqlite_storage(tmp_path):
+    """Заметки и метки сохраняются в SQLite и читаются обратно"""
+    database = SqliteDatabase(str(tmp_path / "notes.db"))
+    notes = NoteService(SqliteNoteStorage(database))
+    labels = LabelService(SqliteLabelStorage(database))
+    assert len(labels.get_labels()) == 4
+
+    notes.create_note("первая", "текст", ["работа", "срочно"])
+    notes.create_note("вторая", "")
+    notes.update_note(1, labels=["срочно"])
+    notes.delete_note(2)
+    labels.delete_label(1)
+    database.close()
+
+    database = SqliteDatabase(str(tmp_path / "notes.db"))
+    restored = NoteService(SqliteNoteStorage(database)).get_notes()
+    assert [(n['id'], n['labels']) for n in restored] == [(1, ["срочно"])]
+    assert [label['id'] for label in LabelService(SqliteLabelStorage(database)).get_labels()] == [2, 3, 4]
+
+
+def test_two_processes_share_json_files(tmp_path):
+    """Второй экземпляр сервиса (как второй воркер) видит чужие изменения"""
+    first = NoteService(str(tmp_path / "notes.json"), compact_interval=0)
+    second = NoteService(str(tmp_path / "notes.json"), compact_interval=0)
+
+    first.create_note("от первого", "")
+    assert [n['title'] for n in second.get_notes()] == ["от первого"]
+
+    second.create_note("от второго", "")
+    first.compact()
+    assert [n['id'] for n in first.get_notes()] == [1, 2]
+    assert second.get_note(2)['title'] == "от второго"
+
+    labels_a = LabelService(str(tmp_path / "labels.json"))
+    labels_b = LabelService(str(tmp_path / "labels.json"))
+    labels_a.create_label("новая")
+    assert labels_b.create_label("Новая")['id'] == 5
+    assert len(labels_b.get_labels()) == 5
+
+
+def test_group_commit(tmp_path):
+    """Изменения из нескольких потоков попадают на диск общими пачками"""
+    inner = JsonNoteStorage(str(tmp_path / "notes.json"), compact_interval=0)
+    batches = []
+    write_batch = inner.write_batch
+    inner.write_batch = lambda puts, deletes, next_id=None: (batches.append(len(puts)),
+                                                            write_batch(puts, deletes, next_id))
+    service = NoteService(GroupCommitNoteStorage(inner, window=0.05, max_pending=1000))
+
+    threads = [threading.Thread(target=service.create_note, args=(f"заметка {i}", "")) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(batches) == 20 and len(batches) < 20
+    assert len(NoteService(str(tmp_path / "notes.json"), compact_interval=0).get_notes()) == 20
+
+
+def test_group_commit_in_two_processes(tmp_path):
+    """Два экземпляра с групповой записью (как два воркера) не выдают одинаковых id"""
+    def check(open_storage):
+        services = [NoteService(GroupCommitNoteStorage(open_storage(), window=0.01)) for _ in range(2)]
+        created = []
+
+        def create(service):
+            for i in range(15):
+                created.append(service.create_note(f"заметка {i}", "")['id'])
+
+        threads = [threading.Thread(target=create, args=(service,)) for service in services for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for service in services:
+            service.storage.close()
+
+        assert sorted(created) == list(range(1, 61))
+        assert [n['id'] for n in NoteService(open_storage()).get_notes()] == list(range(1, 61))
+
+    check(lambda: JsonNoteStorage(str(tmp_path / "notes.json"), compact_interval=0))
+    check(lambda: SqliteNoteStorage(SqliteDatabase(str(tmp_path / "notes.db"))))
+
+
+def test_ids_not_reused_after_restart(tmp_path):
+    """Счетчик id сохраняется: после удаления последней заметки и перезапуска id не повторяется"""
+    def check(open_notes, open_labels):
+        notes = open_notes()
+        notes.create_note("первая", "")
+        notes.create_note("вторая", "")
+        notes.delete_note(2)
+        notes.compact()
+        assert open_notes().create_note("третья", "")['id'] == 3
+
+        labels = open_labels()
+        label = labels.create_label("новая")
+        labels.delete_label(label['id'])
+        assert open_labels().create_label("другая")['id'] == label['id'] + 1
+
+    check(lambda: NoteService(str(tmp_path / "notes.json"), compact_interval=0),
+          lambda: LabelService(str(tmp_path / "labels.json")))
+
+    database = SqliteDatabase(str(tmp_path / "notes.db"))
+    check(lambda: NoteService(SqliteNoteStorage(database)),
+          lambda: LabelService(SqliteLabelStorage(database)))
+
+
+def test_binary_snapshot(tmp_path):
+    """Двоичный снимок: старый notes.json подхватывается, текст заметок читается при обращении"""
+    from storage.binary_storage import BinaryNoteStorage, LazyNote
+
+    json_service = NoteService(str(tmp_path / "notes.json"), compact_interval=0)
+    json_service.create_note("из json", "старый текст", labels=["работа"])
+    json_service.close()
+
+    def open_notes():
+        return NoteService(BinaryNoteStorage(str(tmp_path / "notes.bin"), compact_interval=0,
+                                             json_file=str(tmp_path / "notes.json")))
+
+    service = open_notes()
+    service.create_note("вторая", "текст про отпуск", labels=["личное"])
+    service.update_note(1, title="новый заголовок")
+    service.compact()
+    assert (tmp_path / "notes.bin.1").exists()
+
+    restored = open_notes()
+    note = restored.notes[2]
+    assert isinstance(note, LazyNote)
+    assert restored.get_notes(label_filter="личное")[0]['id'] == 2
+    assert restored.search_index is None
+    assert [n['id'] for n in restored.search_notes("отпуск")] == [2]
+    assert note.to_dict()['content'] == "текст про отпуск"
+    restored.update_note(1, content="правка")
+    assert restored.get_note(1)['title'] == "новый заголовок"
+    assert restored.get_note(1)['content'] == "правка"
+    assert restored.create_note("третья", "")['id'] == 3
+
+
+def test_binary_compaction_keeps_mapped_snapshot(tmp_path, monkeypatch):
+    """Сжатие не трогает отображенный в память снимок: как на Windows, где его нельзя ни подменить, ни удалить"""
+    import os
+    from storage.binary_storage import BinaryNoteStorage, LazyNote
+
+    def open_notes():
+        return NoteService(BinaryNoteStorage(str(tmp_path / "notes.bin"), compact_interval=0))
+
+    service = open_notes()
+    service.create_note("первая", "текст")
+    service.compact()
+    live = open_notes()
+    assert isinstance(live.notes[1], LazyNote)
+
+    replace, remove = os.replace, os.remove
+
+    def replace_unless_exists(src, dst):
+        if os.path.exists(dst):
+            raise PermissionError(f"{dst} is mapped")
+        replace(src, dst)
+
+    def remove_unless_snapshot(path):
+        if ".bin" in os.path.basename(path):
+            raise PermissionError(f"{path} is mapped")
+        remove(path)
+
+    monkeypatch.setattr(os, "replace", replace_unless_exists)
+    monkeypatch.setattr(os, "remove", remove_unless_snapshot)
+    live.create_note("вторая", "")
+    live.compact()
+    assert (tmp_path / "notes.wal").stat().st_size == 0
+    assert (tmp_path / "notes.bin.1").exists() and (tmp_path / "notes.bin.2").exists()
+    assert live.notes[1].title == "первая"
+
+    restored = open_notes()
+    assert [n['title'] for n in restored.get_notes()] == ["первая", "вторая"]
+    assert live.storage.has_changed() is False
+
+    monkeypatch.undo()
+    restored.create_note("третья", "")
+    restored.compact()
+    assert sorted(p.name for p in tmp_path.glob("notes.bin*")) == ["notes.bin.3", "notes.bin.lock"]
+
+
+def test_workspaces_are_isolated_and_evicted(tmp_path):
+    """У каждого пространства свои данные; простаивающие выгружаются, занятые - нет"""
+    import pytest
+    from services.factory import DEFAULT_CONFIG, Services
+
+    services = Services(dict(DEFAULT_CONFIG, COMMIT_WINDOW_MS=0, WORKSPACES_MAX_LOADED=1), tmp_path)
+    with services.workspace("acme") as acme:
+        acme.notes.create_note("для acme", "")
+        with services.workspace("beta") as beta:
+            beta.notes.create_note("для beta", "")
+            # Оба заняты запросами - лимит временно превышен
+            assert list(services.loaded) == ["acme", "beta"]
+        assert list(services.loaded) == ["acme"]
+    with pytest.raises(ValueError):
+        services.acquire("../acme")
+
+    with services.workspace("beta") as beta:
+        assert [n['title'] for n in beta.notes.get_notes()] == ["для beta"]
+    assert list(services.loaded) == ["beta"]
+    with services.workspace() as default:
+        assert default.notes.get_notes() == []
+    assert (tmp_path / "workspaces" / "acme").is_dir()
+    services.close()
+
+
+def test_long_content_is_compressed(tmp_path):
+    """Длинный текст хранится сжатым в памяти и во всех хранилищах, а наружу отдается как есть"""
+    from storage.binary_storage import BinaryNoteStorage
+    from storage.compression import CompressedText
+
+    log = "2025-12-14 ERROR connection refused\n" * 2000
+    storages = [
+        lambda: str(tmp_path / "notes.json"),
+        lambda: SqliteNoteStorage(SqliteDatabase(str(tmp_path / "notes.db"))),
+        lambda: BinaryNoteStorage(str(tmp_path / "notes.bin"), compact_interval=0),
+    ]
+    for open_storage in storages:
+        service = NoteService(open_storage(), compact_interval=0)
+        service.create_note("лог", log)
+        service.create_note("короткая", "текст")
+        assert isinstance(service.notes[1]._content, CompressedText)
+        assert service.notes[2]._content == "текст"
+        service.compact()
+
+        restored = NoteService(open_storage(), compact_interval=0)
+        assert isinstance(restored.notes[1]._content, CompressedText)
+        assert restored.get_note(1)['content'] == log
+        assert [n['id'] for n in restored.search_notes("refused")] == [1]
+
+    assert log.encode() not in (tmp_path / "notes.json").read_bytes()
+
+
+def test_projection_skips_content(tmp_path, monkeypatch):
+    """fields без content не распаковывают сжатый текст ни в памяти, ни у архивных заметок"""
+    from storage.compression import CompressedText
+
+    service = NoteService(str(tmp_path / "notes.json"), compact_interval=0)
+    for i in range(5):
+        service.create_note(f"лог {i}", "2025-12-14 ERROR connection refused\n" * 2000)
+    service.update_note(5, status="archived")
+    decompressed = []
+    text = CompressedText.text
+    monkeypatch.setattr(CompressedText, 'text', lambda self: decompressed.append(1) or text(self))
+
+    page = service.get_notes_page(limit=5, fields=['id', 'title'])
+    assert page['notes'][0] == {'id': 5, 'title': "лог 4"}
+    assert [n['id'] for n in service.get_notes(fields=['id', 'status'])] == [1, 2, 3, 4, 5]
+    assert decompressed == []
+    assert service.get_notes_page(limit=1, fields=['content'])['notes'][0]['content'].startswith("2025")
@@ -0,0 +1,44 @@
+"""Перевод снимка заметок между форматами: notes.json <-> notes.bin.
+
+Формат определяется по расширению. Двоичный снимок читается из последнего
+файла notes.bin.N и пишется в следующий. Журнал notes.wal у обоих форматов
+общий и не меняется. Запускать при остановленном сервере, из папки backend:
+    python tools/convert_snapshot.py data/notes.json data/notes.bin
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.binary_storage import BinarySnapshot, current_snapshot, write_new_snapshot
+from storage.compression import encode_note
+from storage.json_storage import read_json_snapshot, write_json_atomic
+
+
+def read_snapshot(path):
+    if path.endswith('.bin'):
+        snapshot = BinarySnapshot(current_snapshot(path))
+        # Сжатый текст переносится сжатым
+        return [encode_note(note.to_record()) for note in snapshot.notes()], snapshot.next_id
+    notes, next_id = read_json_snapshot(path)
+    return list(notes.values()), next_id
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    source, target = sys.argv[1], sys.argv[2]
+    if not os.path.exists(source) and not (source.endswith('.bin') and current_snapshot(source)):
+        print(f"{source} not found")
+        sys.exit(1)
+    notes, next_id = read_snapshot(source)
+    if target.endswith('.bin'):
+        write_new_snapshot(target, notes, next_id)
+    else:
+        write_json_atomic(target, {'next_id': next_id, 'notes': notes}, indent=2)
+    print(f"{len(notes)} notes: {source} -> {target}")
+
+
+if __name__ == '__main__':
+    main()
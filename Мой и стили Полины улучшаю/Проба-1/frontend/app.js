@@ -3,6 +3,7 @@
         this.apiBase = 'http://localhost:5000/api';
         this.notes = [];
         this.labels = [];
+        this.reloadTimer = null;
         this.init();
     }
 
@@ -11,6 +12,32 @@
         await this.loadLabels();
         await this.loadNotes();
         this.setupEventListeners();
+        this.subscribeEvents();
+    }
+
+    // Изменения от других вкладок и клиентов приходят через Server-Sent Events
+    subscribeEvents() {
+        if (!window.EventSource) return;
+        const source = new EventSource(`${this.apiBase}/events`);
+        const noteEvents = ['note_created', 'note_updated', 'note_deleted', 'notes_imported', 'label_removed'];
+        const labelEvents = ['label_created', 'label_deleted'];
+        noteEvents.forEach(name => source.addEventListener(name, () => this.scheduleReload(false)));
+        labelEvents.forEach(name => source.addEventListener(name, () => this.scheduleReload(true)));
+        // Сервер отключил нас из-за отставания - данные могли устареть целиком
+        source.addEventListener('resync', () => this.scheduleReload(true));
+    }
+
+    // Несколько событий подряд приводят к одной перезагрузке
+    scheduleReload(withLabels) {
+        this.reloadLabels = this.reloadLabels || withLabels;
+        clearTimeout(this.reloadTimer);
+        this.reloadTimer = setTimeout(async () => {
+            if (this.reloadLabels) {
+                this.reloadLabels = false;
+                await this.loadLabels();
+            }
+            await this.loadNotes();
+        }, 300);
     }
 
     async loadNotes() {
@@ -377,34 +404,7 @@
 
         try {
 
-            const validatedLabels = [];
-            for (const labelName of labelNames) {
-                try {
-                    // Проверяем, существует ли метка
-                    const existingLabel = this.labels.find(l => l.name.toLowerCase() === labelName.toLowerCase());
-
-                    if (!existingLabel) {
-                        // Создаем новую метку
-                        const response = await fetch(`${this.apiBase}/labels`, {
-                            method: 'POST',
-                            headers: { 'Content-Type': 'application/json' },
-                            body: JSON.stringify({ name: labelName })
-                        });
-
-                        if (response.ok) {
-                            const newLabel = await response.json();
-                            validatedLabels.push(newLabel.name);
-                            // Обновляем список меток
-                            await this.loadLabels();
-                        }
-                    } else {
-                        validatedLabels.push(existingLabel.name);
-                    }
-                } catch (error) {
-                    console.error(`Error processing label "${labelName}":`, error);
-                    validatedLabels.push(labelName); // Все равно добавляем
-                }
-            }
+            const validatedLabels = await this.ensureLabels(labelNames);
             // Определяем - это редактирование или создание
             const isEdit = noteId !== '';
             const url = isEdit
@@ -443,6 +443,42 @@
         }
     }
 
+    // Возвращает имена меток как они записаны на сервере; недостающие создаются одним запросом
+    async ensureLabels(labelNames) {
+        const findLabel = (name) => this.labels.find(l => l.name.toLowerCase() === name.toLowerCase());
+        const missing = labelNames.filter(name => !findLabel(name));
+
+        const created = {};
+        if (missing.length > 0) {
+            try {
+                const response = await fetch(`${this.apiBase}/labels:batch`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({
+                        operations: missing.map(name => ({ op: 'create', name: name }))
+                    })
+                });
+
+                if (response.ok) {
+                    const { results } = await response.json();
+                    results.forEach((result, i) => {
+                        if (result.ok) created[missing[i].toLowerCase()] = result.label.name;
+                    });
+                    // Обновляем список меток
+                    await this.loadLabels();
+                }
+            } catch (error) {
+                console.error('Error creating labels:', error);
+            }
+        }
+
+        return labelNames.map(name => {
+            const existingLabel = findLabel(name);
+            if (existingLabel) return existingLabel.name;
+            return created[name.toLowerCase()] || name; // Все равно добавляем
+        });
+    }
+
     async updateNoteStatus(noteId, status) {
         try {
             const response = await fetch(`${this.apiBase}/notes/${noteId}`, {